@@ -1,5 +1,6 @@
 import json
 from db import db  # Import the singleton Database instance from db.py
+from Utils.userDirectory import user_directory
 
 
 class DataImporter:
@@ -105,9 +106,9 @@ class DataImporter:
                 db.is_reviews_collection_empty()
             )
 
-            # Reload users into memory after importing
-            print("Reloading users into memory...")
-            db.load_all_users()
+            # Rebuild the public user directory (Utils/userDirectory.py) from the imported users
+            print("Reloading the user directory...")
+            user_directory.reload()
             print("Data import process completed.")
 
         except Exception as e:
@@ -9,10 +9,11 @@ class APIFeatures:
     def __init__(self, query, query_params):
         self.query = query  # MongoEngine QuerySet
         self.query_params = query_params  # flask.request.args.to_dict()
+        self.fields = []  # Validated ?fields= selection, set by limit_fields
 
     def filter(self):
         query_obj = deepcopy(self.query_params)
-        excluded_fields = ['page', 'sort', 'limit', 'fields']
+        excluded_fields = ['page', 'sort', 'limit', 'fields', 'count']
         for field in excluded_fields:
             query_obj.pop(field, None)
 
@@ -67,6 +68,7 @@ class APIFeatures:
                     except Exception as e:
                         logger.warning(f"Invalid field ignored: {field} ({str(e)})")
                 if valid_fields:
+                    self.fields = valid_fields
                     self.query = self.query.only(*valid_fields)
                 else:
                     logger.debug("No valid fields to limit")
@@ -74,9 +76,56 @@ class APIFeatures:
         return self
 
     def paginate(self):
-        page = int(self.query_params.get('page', 1))
-        limit = int(self.query_params.get('limit', 100))
-        skip = (page - 1) * limit
+        skip, limit = page_window(self.query_params)
         self.query = self.query.skip(skip).limit(limit)
-        logger.debug(f"Paginated: page={page}, limit={limit}")
-        return self
\ No newline at end of file
+        logger.debug(f"Paginated: page={self.query_params.get('page', 1)}, limit={limit}")
+        return self
+
+
+def page_window(query_params):
+    """(skip, limit) for ?page=&limit= (defaults: page 1, 100 per page)."""
+    page = int(query_params.get('page', 1))
+    limit = int(query_params.get('limit', 100))
+    return (page - 1) * limit, limit
+
+
+class QueryPlan:
+    """
+    A list request's filter, sort, field selection and page, built with APIFeatures and executed once.
+
+    Without ?count=true the page is one find. With it, the page and the total number of matches come back
+    together from a single $facet aggregation instead of a second count command.
+    """
+
+    def __init__(self, query, query_params):
+        features = APIFeatures(query, query_params).filter().sort().limit_fields()
+        self.query = features.query
+        self.fields = features.fields
+        self.skip, self.limit = page_window(query_params)
+        self.with_total = str(query_params.get('count', '')).lower() in ('1', 'true', 'yes')
+        self.total = None
+
+    def execute(self):
+        """Documents on the requested page; also sets self.total when ?count=true was given."""
+        if not self.with_total:
+            return list(self.query.skip(self.skip).limit(self.limit))
+
+        # aggregate() starts from the queryset's own $match and $sort
+        page = [{'$skip': self.skip}, {'$limit': self.limit}]
+        if self.fields:
+            page.append({'$project': self._projection()})
+        result = next(self.query.aggregate([
+            {'$facet': {'documents': page, 'total': [{'$count': 'total'}]}}
+        ]), None) or {'documents': [], 'total': []}
+
+        self.total = result['total'][0]['total'] if result['total'] else 0
+        # Raw documents become model instances the way Utils/tourDetailRepository.assemble builds them
+        return [self.query._document._from_son(son) for son in result['documents']]
+
+    def _projection(self):
+        """The database fields .only(*self.fields) selects; _id is always included."""
+        document = self.query._document
+        return {
+            '.'.join(getattr(part, 'db_field', part) for part in document._lookup_field(field.split('.'))): 1
+            for field in self.fields
+        }
@@ -0,0 +1,56 @@
+import hashlib
+import re
+from datetime import timezone
+
+from flask import request, make_response
+
+# Uploaded files carry a uuid4 hex in their name and are never rewritten in place
+IMMUTABLE_FILENAME_PATTERN = re.compile(r'[0-9a-f]{32}')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, no-cache'
+
+
+def compute_etag(image_data) -> str:
+    """Content hash stored next to each image document and sent as its ETag."""
+    return hashlib.sha256(bytes(image_data)).hexdigest()
+
+
+def cache_control_for(filename: str) -> str:
+    """Long-lived caching for uuid-named uploads, revalidation for everything else."""
+    if filename and IMMUTABLE_FILENAME_PATTERN.search(filename):
+        return IMMUTABLE_CACHE_CONTROL
+    return REVALIDATE_CACHE_CONTROL
+
+
+def as_utc(value):
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+
+def is_not_modified(etag, last_modified) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since for the current request."""
+    if request.if_none_match:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2)
+        return bool(etag) and request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        return as_utc(last_modified) <= as_utc(request.if_modified_since)
+    return False
+
+
+def apply_validators(response, etag, last_modified, cache_control):
+    """Attach ETag, Last-Modified and Cache-Control headers to an image response."""
+    if etag:
+        response.set_etag(etag)
+    if last_modified:
+        response.last_modified = as_utc(last_modified)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def not_modified_response(etag, last_modified, cache_control):
+    """Build an empty 304 response carrying the same validators as the full one."""
+    response = make_response('', 304)
+    return apply_validators(response, etag, last_modified, cache_control)
@@ -0,0 +1,115 @@
+import io
+import math
+import os
+import time
+from collections import namedtuple
+from typing import Optional
+
+from PIL import Image, UnidentifiedImageError
+
+# File-size/quality tuning shared by the image upload scripts (can be overridden via env vars)
+MAX_IMAGE_SIZE_MB = float(os.getenv("MAX_IMAGE_SIZE_MB", "15.5"))
+MAX_IMAGE_BYTES = int(MAX_IMAGE_SIZE_MB * 1024 * 1024)
+IMAGE_QUALITY_START = int(os.getenv("IMAGE_QUALITY_START", "85"))
+IMAGE_QUALITY_MIN = int(os.getenv("IMAGE_QUALITY_MIN", "35"))
+IMAGE_DOWNSCALE_STEP = float(os.getenv("IMAGE_DOWNSCALE_STEP", "0.9"))
+MIN_EDGE_AFTER_DOWNSCALE = int(os.getenv("MIN_EDGE_AFTER_DOWNSCALE", "600"))
+# Binary search on quality stops once the fitting and non-fitting qualities are this close
+IMAGE_QUALITY_TOLERANCE = int(os.getenv("IMAGE_QUALITY_TOLERANCE", "2"))
+# Typical JPEG size per pixel at the starting quality, used to size up non-JPEG sources before encoding
+JPEG_BYTES_PER_PIXEL = float(os.getenv("JPEG_BYTES_PER_PIXEL", "0.35"))
+# How far lowering quality from IMAGE_QUALITY_START to IMAGE_QUALITY_MIN usually shrinks a JPEG
+MIN_QUALITY_SIZE_RATIO = float(os.getenv("MIN_QUALITY_SIZE_RATIO", "0.35"))
+
+# Outcome of the quality search at one scale: data/quality are None when even IMAGE_QUALITY_MIN is too big,
+# and size is the byte length of the last encode kept (the IMAGE_QUALITY_MIN one in that case)
+QualitySearch = namedtuple("QualitySearch", "data quality size")
+
+
+def _estimate_scale(img, raw_size):
+    """
+    Guess the downscale needed before any encode: JPEG bytes are taken from the file itself,
+    other formats from their pixel count, and quality alone is assumed to cover a MIN_QUALITY_SIZE_RATIO shrink.
+    """
+    width, height = img.size
+    jpeg_bytes = raw_size if img.format == "JPEG" else width * height * JPEG_BYTES_PER_PIXEL
+    ratio = MAX_IMAGE_BYTES / max(jpeg_bytes, 1)
+    if ratio >= MIN_QUALITY_SIZE_RATIO:
+        return 1.0
+    return math.sqrt(ratio / MIN_QUALITY_SIZE_RATIO)
+
+
+def compress_image_to_limit(file_path: str, stats: Optional[dict] = None) -> Optional[bytes]:
+    """
+    Downscale/re-encode the image until it fits under MongoDB's 16 MB document limit.
+    Quality is binary-searched and the scale estimated from bytes per pixel, so a file takes a handful of encodes.
+    Returns raw bytes or None if compression fails; `stats` receives encode count, time, quality and scale.
+    """
+    started = time.perf_counter()
+    encodes = 0
+
+    def encode(frame, quality, optimize=False):
+        nonlocal encodes
+        encodes += 1
+        buffer = io.BytesIO()
+        frame.save(buffer, format="JPEG", quality=quality, optimize=optimize)
+        return buffer.getvalue()
+
+    def search_quality(frame):
+        """Highest quality that fits under MAX_IMAGE_BYTES, as a QualitySearch."""
+        data = encode(frame, IMAGE_QUALITY_START)
+        if len(data) <= MAX_IMAGE_BYTES:
+            return QualitySearch(data, IMAGE_QUALITY_START, len(data))
+        data = encode(frame, IMAGE_QUALITY_MIN)
+        if len(data) > MAX_IMAGE_BYTES:
+            return QualitySearch(None, None, len(data))
+        low, high = IMAGE_QUALITY_MIN, IMAGE_QUALITY_START  # low fits, high does not
+        while high - low > IMAGE_QUALITY_TOLERANCE:
+            middle = (low + high) // 2
+            candidate = encode(frame, middle)
+            if len(candidate) <= MAX_IMAGE_BYTES:
+                low, data = middle, candidate
+            else:
+                high = middle
+        return QualitySearch(data, low, len(data))
+
+    def report(result, quality, scale):
+        elapsed = time.perf_counter() - started
+        if stats is not None:
+            stats.update({"encodes": encodes, "seconds": round(elapsed, 3), "quality": quality,
+                          "scale": round(scale, 3), "bytes": len(result) if result is not None else None})
+        if result is not None:
+            print(f"Compressed {os.path.basename(file_path)} -> {len(result) / (1024 * 1024):.2f} MB at quality {quality}, "
+                  f"scale {scale:.2f} ({encodes} encodes, {elapsed:.2f}s)")
+        return result
+
+    try:
+        with Image.open(file_path) as img:
+            width, height = img.size
+            # Never go below MIN_EDGE_AFTER_DOWNSCALE on the short edge, and never upscale small images
+            min_scale = min(1.0, MIN_EDGE_AFTER_DOWNSCALE / min(width, height))
+            scale = max(min_scale, _estimate_scale(img, os.path.getsize(file_path)))
+            if scale < 1 and img.format == "JPEG":
+                # Let libjpeg decode straight at 1/2, 1/4 or 1/8 size instead of decoding every pixel and resizing
+                img.draft("RGB", (int(width * scale), int(height * scale)))
+            img = img.convert("RGB")
+
+            while True:
+                size = (round(width * scale), round(height * scale))
+                frame = img if img.size == size else img.resize(size, Image.LANCZOS)
+                search = search_quality(frame)
+                if search.data is not None:
+                    # Optimized Huffman tables only ever shrink the output, so the chosen quality still fits
+                    return report(encode(frame, search.quality, optimize=True), search.quality, scale)
+                if scale <= min_scale:
+                    print(f"Unable to shrink {file_path} below {MAX_IMAGE_SIZE_MB}MB without going under minimum dimensions.")
+                    return report(None, None, scale)
+
+                # Too big even at minimum quality: bytes follow pixel count, so shrink by the square root of the overshoot
+                scale = max(min_scale, scale * min(IMAGE_DOWNSCALE_STEP, math.sqrt(MAX_IMAGE_BYTES / search.size) * 0.95))
+    except UnidentifiedImageError:
+        print(f"Unsupported image format for {file_path}. Skipping.")
+        return None
+    except Exception as exc:
+        print(f"Failed to compress {file_path}: {exc}")
+        return None
@@ -0,0 +1,243 @@
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from PIL import Image
+
+from Utils.AppError import AppError
+from Utils.imageCompression import MAX_IMAGE_BYTES, MAX_IMAGE_SIZE_MB, compress_image_to_limit
+from Utils.imageRenditions import render_tour_renditions
+from Utils.imageVariants import AVATAR_VARIANT_SIZES, avatar_format_for, render_avatar_variant
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Processes rendering uploads off the request thread; 0 renders inline (useful for scripts and debugging)
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', min(4, os.cpu_count() or 1)))
+# Workers are forked from a clean server process rather than from the threaded web worker,
+# so they never inherit request threads, held locks or MongoDB sockets
+IMAGE_WORKER_START_METHOD = os.getenv('IMAGE_WORKER_START_METHOD', 'forkserver')
+# Threads storing finished jobs (GridFS writes, status updates), so slow MongoDB I/O never runs on
+# the process pool's result thread and holds up the results of other jobs
+IMAGE_COMPLETION_WORKERS = int(os.getenv('IMAGE_COMPLETION_WORKERS', 2))
+
+TOUR_IMAGE_SIZE = (2000, 1333)
+USER_PHOTO_SIZE = (500, 500)
+
+# Uploads are checked on the request thread before they are stored or queued (can be overridden via env vars)
+MAX_UPLOAD_SIZE_MB = float(os.getenv('MAX_UPLOAD_SIZE_MB', 20))
+MAX_UPLOAD_BYTES = int(MAX_UPLOAD_SIZE_MB * 1024 * 1024)
+UPLOAD_IMAGE_FORMATS = ('JPEG', 'PNG', 'BMP', 'TIFF', 'WEBP')
+
+_executor = None
+_completion_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=IMAGE_WORKERS,
+                mp_context=multiprocessing.get_context(IMAGE_WORKER_START_METHOD)
+            )
+        return _executor
+
+
+def _get_completion_executor():
+    global _completion_executor
+    with _executor_lock:
+        if _completion_executor is None:
+            _completion_executor = ThreadPoolExecutor(
+                max_workers=max(1, IMAGE_COMPLETION_WORKERS), thread_name_prefix='image-completion'
+            )
+        return _completion_executor
+
+
+def shutdown_image_workers(wait=True):
+    global _executor, _completion_executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
+        # After the process pool, so completions of the jobs it just finished are still stored
+        if _completion_executor is not None:
+            _completion_executor.shutdown(wait=wait)
+            _completion_executor = None
+
+
+def staging_filename(filename):
+    """
+    Name an upload is stored under while it renders. The final uuid name is served as immutable,
+    so it is only written once, with the rendered image; the staged original is dropped after that.
+    """
+    return f"staging-{filename}"
+
+
+def validate_upload(filename, image_data):
+    """
+    Reject an upload that is too large, not a readable image, or not in UPLOAD_IMAGE_FORMATS with a 400,
+    so only intact originals are stored and handed to the pool. verify() parses the file without decoding pixels.
+    """
+    if not image_data:
+        raise AppError(f"{filename} is empty.", 400)
+    if len(image_data) > MAX_UPLOAD_BYTES:
+        raise AppError(f"{filename} is larger than {MAX_UPLOAD_SIZE_MB:g} MB.", 400)
+    try:
+        with Image.open(io.BytesIO(image_data)) as image:
+            image_format = image.format
+            image.verify()
+    except Exception as e:
+        logger.warning(f"Rejected upload {filename}: {e}")
+        raise AppError(f"{filename} is not a valid image.", 400)
+    if image_format not in UPLOAD_IMAGE_FORMATS:
+        raise AppError(f"{filename} is a {image_format} image. Please upload PNG, JPEG, BMP, TIFF, or WebP.", 400)
+
+
+# Worker-side functions: module level so they can be pickled into the pool, and free of any database access
+
+def render_tour_image(filename, image_data):
+    """Normalise an uploaded tour image to a 2000x1333 JPEG and render its responsive renditions."""
+    image = Image.open(io.BytesIO(image_data))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image = image.resize(TOUR_IMAGE_SIZE, Image.Resampling.LANCZOS)
+    img_byte_arr = io.BytesIO()
+    image.save(img_byte_arr, 'JPEG', quality=90)
+    full_image = img_byte_arr.getvalue()
+
+    images = [(filename, full_image, {'type': 'tour_image'})]
+    images.extend(render_tour_renditions(filename, full_image))
+    return images
+
+
+def render_user_photo(filename, image_data):
+    """Normalise an uploaded user photo to 500x500 and render every avatar variant from it."""
+    save_format, _ = avatar_format_for(filename)
+    image = Image.open(io.BytesIO(image_data))
+    if image.mode in ('RGBA', 'P') and save_format == 'JPEG':
+        image = image.convert('RGB')
+    image = image.resize(USER_PHOTO_SIZE, Image.Resampling.LANCZOS)
+    img_byte_arr = io.BytesIO()
+    image.save(img_byte_arr, format=save_format, quality=90 if save_format == 'JPEG' else None)
+    photo = img_byte_arr.getvalue()
+
+    variants = {size: render_avatar_variant(photo, size, save_format) for size in AVATAR_VARIANT_SIZES}
+    return photo, variants
+
+
+def prepare_image_file(file_path, metadata, known_sha256=None, allow_large=False, renditions=False):
+    """
+    Hash a source file for incremental ingestion and, unless its content is already stored,
+    load it (compressing it under the inline size limit if needed) and render its renditions.
+    """
+    filename = os.path.basename(file_path)
+    try:
+        stat = os.stat(file_path)
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+    except OSError as e:
+        return {'filename': filename, 'source': None, 'unchanged': False, 'images': [], 'error': str(e)}
+    source = {
+        'source_sha256': hashlib.sha256(raw).hexdigest(),
+        'source_mtime': stat.st_mtime,
+        'source_size': stat.st_size
+    }
+    result = {'filename': filename, 'source': source, 'unchanged': False, 'images': []}
+    if source['source_sha256'] == known_sha256:
+        result['unchanged'] = True
+        return result
+
+    if len(raw) <= MAX_IMAGE_BYTES or allow_large:
+        image_data = raw
+    else:
+        print(f"{filename} is {len(raw) / (1024 * 1024):.2f} MB, attempting to compress...")
+        result['compression'] = {}
+        image_data = compress_image_to_limit(file_path, stats=result['compression'])
+        if image_data is None:
+            result['error'] = f"unable to prepare binary under {MAX_IMAGE_SIZE_MB}MB"
+            return result
+
+    result['images'].append((filename, image_data, {**(metadata or {}), **source}))
+    if renditions:
+        try:
+            result['images'].extend(render_tour_renditions(filename, image_data))
+        except Exception as e:
+            # The original is still worth storing; views fall back to it when a rendition is missing
+            result['error'] = f"could not render renditions: {e}"
+    return result
+
+
+def map_image_jobs(function, argument_tuples):
+    """
+    Run function(*args) for each tuple in the worker pool and yield the results in order.
+    At most twice the worker count is in flight, so results are consumed as they arrive instead of piling up.
+    """
+    if IMAGE_WORKERS <= 0:
+        for args in argument_tuples:
+            yield function(*args)
+        return
+
+    executor = _get_executor()
+    pending = deque()
+    for args in argument_tuples:
+        pending.append(executor.submit(function, *args))
+        if len(pending) >= IMAGE_WORKERS * 2:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def submit_image_jobs(tasks, on_complete):
+    """
+    Run (function, args) tasks in the worker pool and call on_complete(results, errors) once all have finished.
+    Results and errors are lists aligned with `tasks`; on_complete runs on a completion thread.
+    """
+    tasks = list(tasks)
+    results = [None] * len(tasks)
+    errors = [None] * len(tasks)
+    remaining = [len(tasks)]
+    lock = threading.Lock()
+
+    def finish():
+        try:
+            on_complete(results, errors)
+        except Exception as e:
+            logger.error(f"Image job completion handler failed: {str(e)}")
+
+    if not tasks:
+        finish()
+        return
+
+    if IMAGE_WORKERS <= 0:
+        for index, (function, args) in enumerate(tasks):
+            try:
+                results[index] = function(*args)
+            except Exception as e:
+                errors[index] = e
+        finish()
+        return
+
+    def done(index, future):
+        try:
+            results[index] = future.result()
+        except Exception as e:
+            errors[index] = e
+            logger.error(f"Image job {tasks[index][0].__name__} failed: {str(e)}")
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            _get_completion_executor().submit(finish)
+
+    executor = _get_executor()
+    for index, (function, args) in enumerate(tasks):
+        future = executor.submit(function, *args)
+        future.add_done_callback(lambda future, index=index: done(index, future))
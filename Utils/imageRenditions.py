@@ -0,0 +1,71 @@
+import io
+import os
+
+from flask import url_for
+from PIL import Image, ImageOps
+
+# Responsive renditions of every tour image, stored in the imgs collection next to the original.
+# Width x height keeps the 3:2 frame the tour pages were designed around.
+TOUR_RENDITIONS = {
+    'thumb': (400, 267),
+    'card': (800, 533),
+    'hero': (1600, 1067),
+    'full': (2000, 1333),
+}
+RENDITION_FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+RENDITION_QUALITY = int(os.getenv('RENDITION_QUALITY', 82))
+
+
+def is_tour_image(filename: str) -> bool:
+    return bool(filename) and filename.startswith('tour-')
+
+
+def rendition_filename(filename: str, size: str, image_format: str) -> str:
+    """Derived name of a rendition, e.g. tour-1-cover.jpg -> tour-1-cover@card.webp"""
+    stem = os.path.splitext(filename)[0]
+    return f"{stem}@{size}.{image_format}"
+
+
+def negotiate_rendition_format(requested, accept_mimetypes):
+    """Pick the explicit ?format= if valid, else WebP for clients that advertise it, else JPEG."""
+    if requested in RENDITION_FORMATS:
+        return requested
+    # Only an explicit image/webp counts; */* is also sent by clients that cannot decode it
+    if any(mimetype == 'image/webp' and quality > 0 for mimetype, quality in accept_mimetypes or ()):
+        return 'webp'
+    return 'jpeg'
+
+
+def render_tour_renditions(filename: str, image_data: bytes):
+    """
+    Decode a tour image once and yield (rendition filename, bytes, metadata) for every size and format.
+    Sizes are produced largest first so each one is downscaled from the previous, already smaller, frame.
+    """
+    image = Image.open(io.BytesIO(image_data))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    for size, dimensions in sorted(TOUR_RENDITIONS.items(), key=lambda item: -item[1][0]):
+        image = ImageOps.fit(image, dimensions, Image.Resampling.LANCZOS)
+        for image_format, (save_format, _) in RENDITION_FORMATS.items():
+            img_byte_arr = io.BytesIO()
+            image.save(img_byte_arr, format=save_format, quality=RENDITION_QUALITY, optimize=True)
+            metadata = {'type': 'tour_rendition', 'source': filename, 'size': size, 'format': image_format}
+            yield rendition_filename(filename, size, image_format), img_byte_arr.getvalue(), metadata
+
+
+def image_srcset(filename: str, image_format: str = None) -> str:
+    """Build a srcset value listing every rendition width of a tour image served by view_routes.serve_image."""
+    if not is_tour_image(filename):
+        return ''
+    entries = []
+    for size, (width, _) in sorted(TOUR_RENDITIONS.items(), key=lambda item: item[1][0]):
+        params = {'filename': filename, 'size': size}
+        if image_format:
+            params['format'] = image_format
+        entries.append(f"{url_for('view_routes.serve_image', **params)} {width}w")
+    return ', '.join(entries)
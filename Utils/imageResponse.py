@@ -0,0 +1,62 @@
+from flask import Response, request
+from werkzeug.datastructures import ContentRange
+
+from Utils.httpCache import apply_validators, as_utc
+
+# Matches the default GridFS chunk size so each read maps onto a single chunk fetch
+STREAM_CHUNK_SIZE = 255 * 1024
+
+
+def _requested_range(length, etag, last_modified):
+    """
+    Return (start, stop) for a satisfiable single byte range, None to send the whole body,
+    or False when the range cannot be satisfied.
+    """
+    byte_range = request.range
+    if byte_range is None or byte_range.units != 'bytes' or len(byte_range.ranges) != 1:
+        return None
+
+    if_range = request.if_range
+    if if_range.etag is not None and if_range.etag != etag:
+        return None
+    if if_range.date is not None and (last_modified is None or as_utc(last_modified) > as_utc(if_range.date)):
+        return None
+
+    bounds = byte_range.range_for_length(length)
+    return bounds if bounds is not None else False
+
+
+def stream_image_response(stream, length, mimetype, filename, etag, last_modified, cache_control):
+    """
+    Stream an image body in chunks instead of buffering it, honouring single `Range` requests.
+    `stream` is any seekable binary file object (a GridFS download stream or a BytesIO).
+    """
+    bounds = _requested_range(length, etag, last_modified)
+    if bounds is False:
+        stream.close()
+        response = Response(status=416)
+        response.content_range = ContentRange('bytes', None, None, length)
+        return apply_validators(response, etag, last_modified, cache_control)
+
+    start, stop = bounds or (0, length)
+
+    def generate():
+        try:
+            stream.seek(start)
+            remaining = stop - start
+            while remaining > 0:
+                chunk = stream.read(min(STREAM_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            stream.close()
+
+    response = Response(generate(), status=206 if bounds else 200, mimetype=mimetype, direct_passthrough=True)
+    response.content_length = stop - start
+    response.accept_ranges = 'bytes'
+    if bounds:
+        response.content_range = ContentRange('bytes', start, stop, length)
+    response.headers['Content-Disposition'] = f'inline; filename="{filename}"'
+    return apply_validators(response, etag, last_modified, cache_control)
@@ -0,0 +1,41 @@
+import io
+import os
+
+from PIL import Image
+
+# Square avatar renditions served by /api/v1/users/image/<profile_slug>
+DEFAULT_AVATAR_SIZE = 142
+AVATAR_VARIANT_SIZES = sorted(
+    {int(size) for size in os.getenv('AVATAR_VARIANT_SIZES', '142').split(',') if size.strip()}
+    | {DEFAULT_AVATAR_SIZE}
+)
+
+
+def avatar_format_for(filename: str):
+    """Return the (Pillow save format, MIME type) pair used for a stored user photo."""
+    file_extension = filename.split('.')[-1].lower()
+    if file_extension == 'png':
+        return 'PNG', 'image/png'
+    return 'JPEG', 'image/jpeg'
+
+
+def resolve_avatar_size(requested) -> int:
+    """Map a requested size onto one of the configured variant sizes."""
+    try:
+        size = int(requested)
+    except (TypeError, ValueError):
+        return DEFAULT_AVATAR_SIZE
+    return size if size in AVATAR_VARIANT_SIZES else DEFAULT_AVATAR_SIZE
+
+
+def render_avatar_variant(image_data: bytes, size: int, save_format: str) -> bytes:
+    """Decode a stored user photo and re-encode it as a size x size rendition."""
+    image = Image.open(io.BytesIO(image_data))
+    if image.mode in ('RGBA', 'P') and save_format == 'JPEG':
+        image = image.convert('RGB')
+    if image.size != (size, size):
+        image = image.resize((size, size), Image.Resampling.LANCZOS)
+
+    img_byte_arr = io.BytesIO()
+    image.save(img_byte_arr, format=save_format, quality=90 if save_format == 'JPEG' else None)
+    return img_byte_arr.getvalue()
@@ -0,0 +1,268 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, namedtuple
+
+from mongoengine import signals
+from mongoengine.connection import get_db
+from pymongo import CursorType, WriteConcern
+from pymongo.errors import CollectionInvalid, OperationFailure, PyMongoError
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Collections whose writes invalidate in-process caches
+WATCHED_COLLECTIONS = ('tours', 'reviews', 'users', 'testimonials', 'bookings', 'imgs', 'user_imgs')
+# Fields carried on every event so subscribers can find cache entries not keyed by _id
+EVENT_KEY_FIELDS = {
+    'tours': ('slug',),
+    'reviews': ('tour', 'user'),
+    'users': ('profile_slug',),
+    'testimonials': ('user',),
+    'bookings': ('tour', 'user'),
+    'imgs': ('filename',),
+    'user_imgs': ('filename',),
+}
+
+# 'auto' tails change streams and falls back to the journal on a standalone server (which has no change
+# streams); 'change_streams' or 'journal' force one source; 'off' only dispatches this process's own writes
+INVALIDATION_BUS_MODE = os.getenv('INVALIDATION_BUS_MODE', 'auto').lower()
+# Journal fallback: a capped collection the app's own writes are recorded in and every process tails
+INVALIDATION_JOURNAL_COLLECTION = os.getenv('INVALIDATION_JOURNAL_COLLECTION', 'cache_invalidations')
+INVALIDATION_JOURNAL_SIZE_MB = int(os.getenv('INVALIDATION_JOURNAL_SIZE_MB', 16))
+# Seconds between journal polls, and the back-off after a lost change stream or journal cursor
+INVALIDATION_POLL_INTERVAL = float(os.getenv('INVALIDATION_POLL_INTERVAL', 1.0))
+
+if INVALIDATION_BUS_MODE not in ('auto', 'change_streams', 'journal', 'off'):
+    raise ValueError("INVALIDATION_BUS_MODE must be one of: auto, change_streams, journal, off")
+
+# Standalone servers reject $changeStream with this code
+CHANGE_STREAMS_UNSUPPORTED = 40573
+# The resume token fell off the oplog; whatever happened in between is unknown
+CHANGE_STREAM_HISTORY_LOST = 286
+
+# document_id is None for a collection-wide event: subscribers drop everything they cache for the collection
+InvalidationEvent = namedtuple('InvalidationEvent', 'collection document_id operation fields')
+
+
+class InvalidationBus:
+    """
+    Fans out writes to tours, reviews, users, testimonials, bookings and images to the caches of every process.
+
+    Caches subscribe per collection and drop the entries an event names. Writes made by this process are
+    dispatched immediately through notify(); writes made anywhere else arrive from a background thread that
+    tails MongoDB change streams, or, on a standalone server, the journal that notify() also writes to.
+    """
+
+    def __init__(self, mode=INVALIDATION_BUS_MODE):
+        self.requested_mode = mode
+        self.mode = None
+        self._subscribers = defaultdict(list)
+        self._thread = None
+        self._stopped = threading.Event()
+        self._origin = uuid.uuid4().hex
+        self._journal = None
+        self._stats_lock = threading.Lock()
+        self._stats = {'local': 0, 'remote': 0, 'flushes': 0, 'subscriber_errors': 0, 'source_errors': 0}
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        # The listener thread did not survive the fork; create_app() starts a new one in the worker
+        self._thread = None
+        self._stopped = threading.Event()
+        self._origin = uuid.uuid4().hex
+        self._journal = None
+        self.mode = None
+        self._stats_lock = threading.Lock()
+
+    def _count(self, stat):
+        with self._stats_lock:
+            self._stats[stat] += 1
+
+    def subscribe(self, collection, callback):
+        """Call `callback(event)` for every InvalidationEvent on `collection`."""
+        if collection not in EVENT_KEY_FIELDS:
+            raise ValueError(f"Cannot subscribe to unwatched collection {collection}")
+        self._subscribers[collection].append(callback)
+
+    def publish(self, event):
+        """Dispatch an event to this process's subscribers."""
+        if event.document_id is None and not any(event.fields.values()):
+            self._count('flushes')
+        for callback in self._subscribers.get(event.collection, ()):
+            try:
+                callback(event)
+            except Exception as e:
+                self._count('subscriber_errors')
+                logger.error(f"Invalidation subscriber {callback!r} failed for {event.collection}: {e}")
+
+    def notify(self, collection, document_id=None, operation='update', **fields):
+        """Announce a write this process made: dispatched here at once and, in journal mode, to other processes."""
+        event = InvalidationEvent(collection, document_id, operation,
+                                  {field: fields.get(field) for field in EVENT_KEY_FIELDS[collection]})
+        self._count('local')
+        self.publish(event)
+        if self.mode == 'journal':
+            try:
+                self._journal.insert_one({'origin': self._origin, **event._asdict()})
+            except PyMongoError as e:
+                self._count('source_errors')
+                logger.warning(f"Could not record invalidation for {collection} in the journal: {e}")
+
+    def start(self):
+        """Start listening for other processes' writes. Call once per process, after any fork."""
+        if self.requested_mode == 'off' or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='invalidation-bus', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        try:
+            if self.requested_mode in ('auto', 'change_streams'):
+                try:
+                    self._watch_change_streams()
+                    return
+                except OperationFailure as e:
+                    if e.code != CHANGE_STREAMS_UNSUPPORTED or self.requested_mode == 'change_streams':
+                        raise
+                    logger.info("Change streams need a replica set; invalidations fall back to the journal")
+            self._tail_journal()
+        except Exception as e:
+            # Caches keep working on their TTLs and this process's own writes; /health shows listening: false
+            self._count('source_errors')
+            logger.error(f"Invalidation bus stopped listening: {e}")
+
+    def _watch_change_streams(self):
+        projection = {'operationType': 1, 'ns': 1, 'documentKey': 1}
+        for fields in EVENT_KEY_FIELDS.values():
+            projection.update({f"fullDocument.{field}": 1 for field in fields})
+        pipeline = [{'$match': {'ns.coll': {'$in': list(WATCHED_COLLECTIONS)}}}, {'$project': projection}]
+        resume_token = None
+        while not self._stopped.is_set():
+            try:
+                with get_db().watch(pipeline, full_document='updateLookup', resume_after=resume_token) as stream:
+                    if self.mode is None:
+                        self.mode = 'change_streams'
+                        logger.info("Invalidation bus tailing change streams")
+                    while not self._stopped.is_set() and stream.alive:
+                        change = stream.try_next()
+                        if change is not None:
+                            self._publish_change(change)
+                        resume_token = stream.resume_token
+            except OperationFailure as e:
+                if self.mode is None:
+                    raise
+                self._count('source_errors')
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    logger.warning("Change stream history lost; flushing all subscribed caches")
+                    resume_token = None
+                    self._flush_all()
+                else:
+                    logger.error(f"Change stream failed, resuming: {e}")
+                time.sleep(INVALIDATION_POLL_INTERVAL)
+            except PyMongoError as e:
+                self._count('source_errors')
+                logger.error(f"Change stream interrupted, resuming: {e}")
+                time.sleep(INVALIDATION_POLL_INTERVAL)
+
+    def _publish_change(self, change):
+        collection = change['ns']['coll']
+        if change['operationType'] in ('drop', 'rename', 'dropDatabase', 'invalidate'):
+            self._count('remote')
+            self.publish(InvalidationEvent(collection, None, change['operationType'], {}))
+            return
+        document = change.get('fullDocument') or {}
+        fields = {field: document.get(field) for field in EVENT_KEY_FIELDS.get(collection, ())}
+        self._count('remote')
+        self.publish(InvalidationEvent(collection, change['documentKey']['_id'], change['operationType'], fields))
+
+    def _flush_all(self):
+        for collection in WATCHED_COLLECTIONS:
+            self.publish(InvalidationEvent(collection, None, 'flush', {}))
+
+    def _open_journal(self):
+        database = get_db()
+        try:
+            database.create_collection(INVALIDATION_JOURNAL_COLLECTION, capped=True,
+                                       size=INVALIDATION_JOURNAL_SIZE_MB * 1024 * 1024)
+        except CollectionInvalid:
+            pass
+        # Unacknowledged inserts: recording an invalidation must not slow down the write that caused it
+        return database.get_collection(INVALIDATION_JOURNAL_COLLECTION, write_concern=WriteConcern(w=0))
+
+    def _tail_journal(self):
+        last_id = None
+        while not self._stopped.is_set():
+            try:
+                if self._journal is None:
+                    self._journal = self._open_journal()
+                    newest = self._journal.find_one({}, {'_id': 1}, sort=[('$natural', -1)])
+                    last_id = newest['_id'] if newest else None
+                    self.mode = 'journal'
+                    logger.info("Invalidation bus tailing the journal")
+                query = {'_id': {'$gt': last_id}} if last_id else {}
+                cursor = self._journal.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+                while not self._stopped.is_set() and cursor.alive:
+                    for entry in cursor:
+                        last_id = entry['_id']
+                        if entry.get('origin') == self._origin:
+                            continue
+                        self._count('remote')
+                        self.publish(InvalidationEvent(
+                            entry['collection'], entry.get('document_id'), entry.get('operation'), entry.get('fields') or {}
+                        ))
+                    time.sleep(INVALIDATION_POLL_INTERVAL)
+            except PyMongoError as e:
+                self._count('source_errors')
+                logger.error(f"Invalidation journal cursor lost, reopening: {e}")
+            time.sleep(INVALIDATION_POLL_INTERVAL)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        return {
+            'mode': self.mode,
+            'listening': self._thread is not None and self._thread.is_alive(),
+            'subscribers': sum(len(callbacks) for callbacks in self._subscribers.values()),
+            **stats
+        }
+
+
+invalidation_bus = InvalidationBus()
+
+
+def _document_key_fields(document):
+    collection = document._get_collection_name()
+    if collection not in EVENT_KEY_FIELDS:
+        return None, {}
+    fields = {}
+    for field in EVENT_KEY_FIELDS[collection]:
+        value = document._data.get(field)
+        # Reference fields hold the referenced document (or its DBRef); events carry the id
+        fields[field] = getattr(value, 'pk', getattr(value, 'id', value))
+    return collection, fields
+
+
+def _document_saved(sender, document, created=False, **kwargs):
+    collection, fields = _document_key_fields(document)
+    if collection:
+        invalidation_bus.notify(collection, document.pk, 'insert' if created else 'update', **fields)
+
+
+def _document_deleted(sender, document, **kwargs):
+    collection, fields = _document_key_fields(document)
+    if collection:
+        invalidation_bus.notify(collection, document.pk, 'delete', **fields)
+
+
+# Document.save()/delete() anywhere in the process; queryset updates bypass these signals and are only seen
+# through change streams (or when their caller notifies)
+signals.post_save.connect(_document_saved)
+signals.post_delete.connect(_document_deleted)
@@ -0,0 +1,104 @@
+import hashlib
+import os
+import time
+
+from Utils.cache import LRUCache
+
+# JWT library used to sign and verify tokens: 'jose' (python-jose) or 'pyjwt' (PyJWT); compare with scripts/bench_jwt_auth.py
+JWT_BACKEND = os.getenv('JWT_BACKEND', 'jose').lower()
+JWT_ALGORITHM = 'HS256'
+# Verified claims are reused until the token's exp, capped at JWT_DECODE_CACHE_TTL seconds
+JWT_DECODE_CACHE_SIZE = int(os.getenv('JWT_DECODE_CACHE_SIZE', 10000))
+JWT_DECODE_CACHE_TTL = float(os.getenv('JWT_DECODE_CACHE_TTL', 3600))
+
+
+class TokenExpiredError(Exception):
+    """The token's signature is valid but its exp has passed."""
+
+
+class TokenInvalidError(Exception):
+    """The token is malformed, tampered with or signed with another key."""
+
+
+def _jose_backend():
+    from jose import jwt
+    from jose.exceptions import ExpiredSignatureError, JWTError
+
+    def encode(payload, secret):
+        return jwt.encode(payload, secret, algorithm=JWT_ALGORITHM)
+
+    def decode(token, secret):
+        try:
+            return jwt.decode(token, secret, algorithms=[JWT_ALGORITHM])
+        except ExpiredSignatureError as e:
+            raise TokenExpiredError(str(e)) from e
+        except JWTError as e:
+            raise TokenInvalidError(str(e)) from e
+
+    return encode, decode
+
+
+def _pyjwt_backend():
+    try:
+        import jwt
+    except ImportError:
+        raise ValueError("JWT_BACKEND=pyjwt requires the PyJWT package")
+
+    def encode(payload, secret):
+        return jwt.encode(payload, secret, algorithm=JWT_ALGORITHM)
+
+    def decode(token, secret):
+        try:
+            return jwt.decode(token, secret, algorithms=[JWT_ALGORITHM])
+        except jwt.ExpiredSignatureError as e:
+            raise TokenExpiredError(str(e)) from e
+        except jwt.InvalidTokenError as e:
+            raise TokenInvalidError(str(e)) from e
+
+    return encode, decode
+
+
+JWT_BACKENDS = {
+    'jose': _jose_backend,
+    'pyjwt': _pyjwt_backend,
+}
+if JWT_BACKEND not in JWT_BACKENDS:
+    raise ValueError(f"JWT_BACKEND must be one of: {', '.join(JWT_BACKENDS)}")
+
+_encode, _decode = JWT_BACKENDS[JWT_BACKEND]()
+decode_cache = LRUCache(max_items=JWT_DECODE_CACHE_SIZE)
+
+
+def encode_token(payload: dict, secret: str) -> str:
+    return _encode(payload, secret)
+
+
+def verify_token(token: str, secret: str) -> dict:
+    """Verify signature and expiry with the configured backend, without touching the cache."""
+    return _decode(token, secret)
+
+
+def decode_token(token: str, secret: str) -> dict:
+    """
+    Verify a token and return its claims, skipping signature verification for tokens already verified.
+    Entries are keyed by the token's SHA-256 digest and expire with the token, so an expired token
+    always goes back through the backend and raises TokenExpiredError.
+
+    Raises:
+        TokenExpiredError: The token has expired.
+        TokenInvalidError: The token is malformed or its signature does not match.
+    """
+    key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    claims = decode_cache.get(key)
+    if claims is not None:
+        return dict(claims)
+
+    claims = _decode(token, secret)
+    remaining = min(claims.get('exp', 0) - time.time(), JWT_DECODE_CACHE_TTL)
+    if remaining > 0:
+        decode_cache.set(key, dict(claims), ttl=remaining)
+    return claims
+
+
+def jwt_cache_stats() -> dict:
+    return {'backend': JWT_BACKEND, **decode_cache.stats()}
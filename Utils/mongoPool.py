@@ -0,0 +1,192 @@
+import os
+import threading
+import time
+
+from pymongo import monitoring, read_preferences
+
+# Connection pool settings shared by the raw pymongo collections and mongoengine (can be overridden via env vars).
+# Unset values fall back to the driver defaults (maxPoolSize 100, minPoolSize 0, no idle/wait-queue timeout).
+MONGO_POOL_OPTIONS = {
+    'maxPoolSize': ('MONGO_MAX_POOL_SIZE', int),
+    'minPoolSize': ('MONGO_MIN_POOL_SIZE', int),
+    'maxIdleTimeMS': ('MONGO_MAX_IDLE_TIME_MS', int),
+    'waitQueueTimeoutMS': ('MONGO_WAIT_QUEUE_TIMEOUT_MS', int),
+    'serverSelectionTimeoutMS': ('MONGO_SERVER_SELECTION_TIMEOUT_MS', int),
+    # Comma-separated, in order of preference, e.g. "zstd,snappy,zlib" (zstd/snappy need their Python packages)
+    'compressors': ('MONGO_COMPRESSORS', str),
+    'readPreference': ('MONGO_READ_PREFERENCE', str),
+}
+MONGO_POOL_DEFAULTS = {'serverSelectionTimeoutMS': 5000}
+
+
+def mongo_client_options() -> dict:
+    """MongoClient keyword arguments built from the MONGO_* environment variables."""
+    options = dict(MONGO_POOL_DEFAULTS)
+    for option, (env_name, cast) in MONGO_POOL_OPTIONS.items():
+        value = os.getenv(env_name)
+        if value:
+            options[option] = cast(value)
+    return options
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Counts connections in use and the time threads spend waiting to check one out of the pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.open = 0
+            self.in_use = 0
+            self.max_in_use = 0
+            self.checkouts = 0
+            self.checkout_failures = {}
+            self.wait_seconds = 0.0
+            self.max_wait_seconds = 0.0
+            self.pools_cleared = 0
+
+    def _finish_wait(self):
+        started = getattr(self._local, 'started', None)
+        self._local.started = None
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        waited = self._finish_wait()
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def connection_check_out_failed(self, event):
+        waited = self._finish_wait()
+        with self._lock:
+            self.checkout_failures[event.reason] = self.checkout_failures.get(event.reason, 0) + 1
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use = max(0, self.in_use - 1)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open = max(0, self.open - 1)
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pools_cleared += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'open': self.open,
+                'in_use': self.in_use,
+                'max_in_use': self.max_in_use,
+                'checkouts': self.checkouts,
+                'checkout_failures': dict(self.checkout_failures),
+                'avg_wait_ms': round(self.wait_seconds / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'max_wait_ms': round(self.max_wait_seconds * 1000, 3),
+                'pools_cleared': self.pools_cleared
+            }
+
+
+class QueryCounter(monitoring.CommandListener):
+    """
+    Counts the MongoDB commands each request sends. The driver reports a command on the thread that runs it,
+    so a thread-local counter opened by begin() and closed by end() sees exactly one request's commands.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.queries = 0
+            self.max_queries = 0
+
+    def begin(self):
+        self._local.count = 0
+
+    def end(self) -> int:
+        """Commands sent since begin() on this thread (0 if begin() was not called)."""
+        count = getattr(self._local, 'count', None)
+        self._local.count = None
+        if count is None:
+            return 0
+        with self._lock:
+            self.requests += 1
+            self.queries += count
+            self.max_queries = max(self.max_queries, count)
+        return count
+
+    def started(self, event):
+        if getattr(self._local, 'count', None) is not None:
+            self._local.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'queries': self.queries,
+                'avg_per_request': round(self.queries / self.requests, 2) if self.requests else 0.0,
+                'max_per_request': self.max_queries
+            }
+
+
+# Catalogue reads may be served by secondaries at most MONGO_MAX_STALENESS_SECONDS behind the primary;
+# writes, authentication and booking flows always use the primary
+MONGO_CATALOGUE_READ_PREFERENCE = os.getenv('MONGO_CATALOGUE_READ_PREFERENCE', 'secondaryPreferred')
+MONGO_MAX_STALENESS_SECONDS = int(os.getenv('MONGO_MAX_STALENESS_SECONDS', 90))
+
+if MONGO_MAX_STALENESS_SECONDS != -1 and MONGO_MAX_STALENESS_SECONDS < 90:
+    raise ValueError("MONGO_MAX_STALENESS_SECONDS must be at least 90 (or -1 for no bound)")
+
+
+def catalogue_read_preference():
+    """Read preference for catalogue reads, built from MONGO_CATALOGUE_READ_PREFERENCE."""
+    if MONGO_CATALOGUE_READ_PREFERENCE == 'primary':
+        return read_preferences.Primary()
+    modes = {
+        'primaryPreferred': read_preferences.PrimaryPreferred,
+        'secondary': read_preferences.Secondary,
+        'secondaryPreferred': read_preferences.SecondaryPreferred,
+        'nearest': read_preferences.Nearest,
+    }
+    if MONGO_CATALOGUE_READ_PREFERENCE not in modes:
+        raise ValueError(f"MONGO_CATALOGUE_READ_PREFERENCE must be primary or one of: {', '.join(modes)}")
+    return modes[MONGO_CATALOGUE_READ_PREFERENCE](max_staleness=MONGO_MAX_STALENESS_SECONDS)
+
+
+CATALOGUE_READ_PREFERENCE = catalogue_read_preference()
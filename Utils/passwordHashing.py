@@ -0,0 +1,96 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bcrypt import checkpw, gensalt, hashpw
+
+from Utils.AppError import AppError
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# bcrypt work factor for new hashes; pick it with scripts/bench_bcrypt.py. Existing hashes are upgraded on login.
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+# bcrypt releases the GIL, so a few threads hash in parallel while request threads wait on them
+BCRYPT_WORKERS = int(os.getenv('BCRYPT_WORKERS', min(4, os.cpu_count() or 1)))
+# Hashes allowed to wait for a worker before new ones are turned away with a 503
+BCRYPT_MAX_QUEUE = int(os.getenv('BCRYPT_MAX_QUEUE', BCRYPT_WORKERS * 8))
+
+if not 4 <= BCRYPT_ROUNDS <= 31:
+    raise ValueError("BCRYPT_ROUNDS must be between 4 and 31")
+
+_executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix='bcrypt')
+_slots = threading.BoundedSemaphore(BCRYPT_WORKERS + BCRYPT_MAX_QUEUE)
+_stats_lock = threading.Lock()
+_stats = {'in_flight': 0, 'completed': 0, 'rejected': 0, 'wait_seconds': 0.0, 'work_seconds': 0.0}
+
+
+def _run(function, *args):
+    """Run a bcrypt call in the pool, failing fast with a 503 when the queue is full."""
+    if not _slots.acquire(blocking=False):
+        with _stats_lock:
+            _stats['rejected'] += 1
+        logger.warning("Password hashing pool saturated, rejecting request")
+        raise AppError('The server is busy right now. Please try again in a moment.', 503)
+
+    submitted = time.perf_counter()
+    with _stats_lock:
+        _stats['in_flight'] += 1
+
+    def timed():
+        started = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            with _stats_lock:
+                _stats['wait_seconds'] += started - submitted
+                _stats['work_seconds'] += time.perf_counter() - started
+
+    try:
+        return _executor.submit(timed).result()
+    finally:
+        _slots.release()
+        with _stats_lock:
+            _stats['in_flight'] -= 1
+            _stats['completed'] += 1
+
+
+def hash_password(password: str, rounds: int = None) -> str:
+    return _run(hashpw, password.encode('utf-8'), gensalt(rounds or BCRYPT_ROUNDS)).decode('utf-8')
+
+
+def check_password(candidate_password: str, hashed_password: str) -> bool:
+    return _run(checkpw, candidate_password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+
+def hash_rounds(hashed_password: str) -> int:
+    """Work factor a bcrypt hash was made with, read from its $2b$<rounds>$ prefix."""
+    try:
+        return int(hashed_password.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return 0
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    return hash_rounds(hashed_password) != BCRYPT_ROUNDS
+
+
+def password_hashing_stats() -> dict:
+    """Queue depth and timing of the hashing pool, for health checks and tuning BCRYPT_WORKERS."""
+    with _stats_lock:
+        stats = dict(_stats)
+    completed = stats['completed']
+    return {
+        'rounds': BCRYPT_ROUNDS,
+        'workers': BCRYPT_WORKERS,
+        'max_queue': BCRYPT_MAX_QUEUE,
+        'in_flight': stats['in_flight'],
+        'queued': max(0, stats['in_flight'] - BCRYPT_WORKERS),
+        'completed': completed,
+        'rejected': stats['rejected'],
+        'avg_wait_ms': round(stats['wait_seconds'] / completed * 1000, 2) if completed else 0.0,
+        'avg_work_ms': round(stats['work_seconds'] / completed * 1000, 2) if completed else 0.0
+    }
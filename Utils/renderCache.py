@@ -0,0 +1,146 @@
+import os
+import threading
+from functools import wraps
+
+from flask import g, request, session
+from markupsafe import Markup
+
+from Utils.cache import LRUCache
+from Utils.invalidationBus import invalidation_bus
+
+# Seconds a whole page rendered for an anonymous visitor, and a page fragment, are served before being
+# rendered again, and the size budget both share (can be overridden via env vars); a TTL of 0 disables that cache
+RENDER_CACHE_PAGE_TTL = float(os.getenv('RENDER_CACHE_PAGE_TTL', 60))
+RENDER_CACHE_FRAGMENT_TTL = float(os.getenv('RENDER_CACHE_FRAGMENT_TTL', 300))
+RENDER_CACHE_MB = float(os.getenv('RENDER_CACHE_MB', 32))
+
+# Collections public pages are rendered from; a write to one retires everything rendered from it
+RENDER_CACHE_COLLECTIONS = ('tours', 'reviews', 'users', 'testimonials')
+
+
+class Deferred:
+    """
+    A list that `loader` builds the first time a template iterates, indexes, measures or tests it,
+    so a view can hand a query to a cached fragment and the query only runs when the fragment is rendered.
+    """
+    __slots__ = ('_loader', '_items')
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._items = None
+
+    def _load(self):
+        if self._items is None:
+            self._items = list(self._loader())
+        return self._items
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __getitem__(self, index):
+        return self._load()[index]
+
+    def __bool__(self):
+        return bool(self._load())
+
+
+class RenderCache:
+    """
+    Rendered HTML of the public pages, keyed by route, the query args the page varies on and auth state.
+
+    Anonymous GETs are served whole pages; signed-in visitors get their page rendered, with the expensive
+    sections (tour cards, guide cards, the testimonial carousel) reused per role through cached fragments.
+    Each entry is stored under the write generation of the collections it was rendered from, so an
+    invalidation bus event for any of them makes it unreachable at once; the TTL bounds everything else.
+    """
+
+    def __init__(self, page_ttl=RENDER_CACHE_PAGE_TTL, fragment_ttl=RENDER_CACHE_FRAGMENT_TTL, max_mb=RENDER_CACHE_MB):
+        self.page_ttl = page_ttl
+        self.fragment_ttl = fragment_ttl
+        # Sized in characters, which is close enough to bytes for mostly-ASCII HTML
+        self._cache = LRUCache(max_items=None, max_bytes=int(max_mb * 1024 * 1024), sizeof=len)
+        self._generations = dict.fromkeys(RENDER_CACHE_COLLECTIONS, 0)
+        self._lock = threading.Lock()
+        self._bypasses = 0
+        for collection in RENDER_CACHE_COLLECTIONS:
+            invalidation_bus.subscribe(collection, self._on_write)
+
+    def _on_write(self, event):
+        with self._lock:
+            self._generations[event.collection] += 1
+
+    def _version(self, depends_on):
+        return tuple(self._generations[collection] for collection in depends_on)
+
+    @staticmethod
+    def auth_state() -> str:
+        user = getattr(g, 'user', None)
+        if user is None:
+            return 'anonymous'
+        return f"role:{getattr(user.role, 'value', user.role)}"
+
+    def _serves_pages(self) -> bool:
+        # Pending flash messages must be rendered (and consumed) by this request, not skipped by a cached copy
+        return (bool(self.page_ttl) and request.method == 'GET' and not hasattr(g, 'user')
+                and '_flashes' not in session)
+
+    def page(self, *depends_on, vary_on=()):
+        """
+        Decorator caching a view's HTML for anonymous GETs. Apply inside is_logged_in so g.user is known.
+
+        Args:
+            depends_on: Collections the page is rendered from.
+            vary_on: Query args that change the page; any others are left out of the key.
+        """
+        def decorator(f):
+            @wraps(f)
+            def wrapped(*args, **kwargs):
+                if not self._serves_pages():
+                    with self._lock:
+                        self._bypasses += 1
+                    return f(*args, **kwargs)
+                # Versioned before rendering: a write that lands mid-render retires this entry too
+                query = tuple((arg, request.args.get(arg, '').strip()) for arg in vary_on)
+                key = ('page', request.endpoint, tuple(sorted((name, str(value)) for name, value in kwargs.items())),
+                       query, self._version(depends_on))
+                html = self._cache.get(key)
+                if html is not None:
+                    return html
+                result = f(*args, **kwargs)
+                # Only plain 200 renders that left the session alone (no flash messages) are the same for everyone
+                if isinstance(result, str) and not session.modified:
+                    self._cache.set(key, result, ttl=self.page_ttl)
+                return result
+            return wrapped
+        return decorator
+
+    def fragment(self, name, *vary, depends_on=(), caller=None):
+        """
+        Jinja call block caching the HTML it wraps per auth state, registered as `cached_fragment`:
+
+            {% call cached_fragment('guide-cards', depends_on=('users',)) %} ... {% endcall %}
+
+        Positional arguments after the name are extra key parts, e.g. the search term a section lists.
+        """
+        if not self.fragment_ttl:
+            return caller()
+        key = ('fragment', name, tuple(str(part) for part in vary), self.auth_state(), self._version(depends_on))
+        html = self._cache.get(key)
+        if html is None:
+            html = str(caller())
+            self._cache.set(key, html, ttl=self.fragment_ttl)
+        return Markup(html)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._cache.stats(), 'page_bypasses': self._bypasses,
+                    'generations': dict(self._generations)}
+
+
+render_cache = RenderCache()
@@ -0,0 +1,163 @@
+import base64
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from models.reviewModel import REVIEW_AUTHOR_FIELDS, Review
+from models.tourModel import GUIDE_FIELDS, Tour
+from models.userModel import User
+
+# Reviews loaded with the tour detail page; the template shows the first three (can be overridden via env vars)
+TOUR_PAGE_REVIEWS = int(os.getenv('TOUR_PAGE_REVIEWS', 3))
+# Default and largest page of /api/v1/tours/<id>/reviews (can be overridden via env vars)
+TOUR_REVIEWS_PAGE_SIZE = int(os.getenv('TOUR_REVIEWS_PAGE_SIZE', 10))
+TOUR_REVIEWS_MAX_PAGE_SIZE = int(os.getenv('TOUR_REVIEWS_MAX_PAGE_SIZE', 50))
+
+
+def _projection(fields) -> Dict[str, int]:
+    return {field: 1 for field in fields}
+
+
+class TourDetailRepository:
+    """
+    Loads a tour with its guides, a page of its reviews (newest first) with their authors, and the total
+    review count in one aggregation, instead of separate tour, guide, review and author queries.
+
+    Needs MongoDB 5.0+ ($lookup with both localField/foreignField and a pipeline).
+    """
+
+    def pipeline(self, review_skip: int = 0, review_limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        review_page = [{'$sort': {'created_at': -1, '_id': -1}}]
+        if review_skip:
+            review_page.append({'$skip': review_skip})
+        if review_limit is not None:
+            review_page.append({'$limit': review_limit})
+        review_page += [
+            {'$lookup': {
+                'from': User._get_collection_name(),
+                'localField': 'user',
+                'foreignField': '_id',
+                'pipeline': [{'$project': _projection(REVIEW_AUTHOR_FIELDS)}],
+                'as': 'author'
+            }},
+            {'$addFields': {'author': {'$arrayElemAt': ['$author', 0]}}}
+        ]
+        return [
+            {'$limit': 1},
+            {'$lookup': {
+                'from': User._get_collection_name(),
+                'localField': 'guides',
+                'foreignField': '_id',
+                'pipeline': [{'$project': _projection(GUIDE_FIELDS)}],
+                'as': 'guide_docs'
+            }},
+            {'$lookup': {
+                'from': Review._get_collection_name(),
+                'localField': '_id',
+                'foreignField': 'tour',
+                'pipeline': review_page,
+                'as': 'review_page'
+            }},
+            {'$lookup': {
+                'from': Review._get_collection_name(),
+                'localField': '_id',
+                'foreignField': 'tour',
+                'pipeline': [{'$count': 'total'}],
+                'as': 'review_count'
+            }},
+            {'$addFields': {'reviews_count': {'$ifNull': [{'$arrayElemAt': ['$review_count.total', 0]}, 0]}}},
+            {'$project': {'review_count': 0}}
+        ]
+
+    def reviews_after(self, tour_id, cursor: Optional[str] = None,
+                      limit: int = TOUR_REVIEWS_PAGE_SIZE) -> Tuple[List[Review], Optional[str]]:
+        """
+        Next page of a tour's reviews, newest first, with their authors, and the cursor of the page after it
+        (None on the last page). Keyset pagination on (created_at, _id): every page is one range scan of the
+        (tour, created_at, _id) index however deep the client has scrolled.
+        """
+        query = {'tour': tour_id}
+        if cursor:
+            created_at, review_id = decode_review_cursor(cursor)
+            query['$or'] = [
+                {'created_at': {'$lt': created_at}},
+                {'created_at': created_at, '_id': {'$lt': review_id}}
+            ]
+        # One extra review tells whether there is a next page without counting
+        reviews = list(Review.catalogue(__raw__=query).order_by('-created_at', '-id').limit(limit + 1))
+        next_cursor = encode_review_cursor(reviews[limit - 1]) if len(reviews) > limit else None
+        return Review.populate_many(reviews[:limit]), next_cursor
+
+    def _load(self, queryset, review_skip: int, review_limit: Optional[int]) -> Optional[Tour]:
+        docs = list(queryset.aggregate(self.pipeline(review_skip, review_limit)))
+        return self.assemble(docs[0]) if docs else None
+
+    def by_slug(self, slug: str, review_skip: int = 0, review_limit: Optional[int] = None) -> Optional[Tour]:
+        """Public (non-secret) tour by slug, read with the catalogue read preference."""
+        return self._load(Tour.catalogue(slug=slug, secret_tour__ne=True), review_skip, review_limit)
+
+    def by_id(self, tour_id, review_skip: int = 0, review_limit: Optional[int] = None) -> Optional[Tour]:
+        return self._load(Tour.objects(id=tour_id), review_skip, review_limit)
+
+    @staticmethod
+    def assemble(doc: Dict[str, Any]) -> Tour:
+        """
+        Turn the aggregation result into a Tour whose guides and reviews are already populated,
+        as Tour.populate_guides and Review.populate_many would leave them. Also sets tour.reviews_count.
+        """
+        guide_docs = {guide['_id']: guide for guide in doc.pop('guide_docs', [])}
+        review_docs = doc.pop('review_page', [])
+        reviews_count = doc.pop('reviews_count', 0)
+        guide_ids = list(doc.get('guides') or [])
+
+        tour = Tour._from_son(doc)
+        tour.guides = [User._from_son(guide_docs[guide_id]) for guide_id in guide_ids if guide_id in guide_docs]
+        tour.reviews = []
+        for review_doc in review_docs:
+            author = review_doc.pop('author', None)
+            review = Review._from_son(review_doc)
+            # Authors that no longer exist are left as None, like Review.populate_many
+            review.user = User._from_son(author) if author else None
+            tour.reviews.append(review)
+        tour.reviews_count = reviews_count
+        return tour
+
+
+def encode_review_cursor(review: Review) -> str:
+    """Opaque "load more" cursor pointing just past `review` in newest-first order."""
+    # MongoDB stores milliseconds, so nothing finer is needed to find the review again
+    raw = f"{review.created_at.isoformat(timespec='milliseconds')}|{review.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_review_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """(created_at, _id) of the last review of the previous page. Raises ValueError for a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, review_id = raw.split('|')
+        return datetime.fromisoformat(created_at), ObjectId(review_id)
+    except (ValueError, InvalidId) as e:
+        raise ValueError(f"Invalid review cursor: {cursor}") from e
+
+
+def review_to_json(review: Review) -> Dict[str, Any]:
+    """JSON view of a review populated by TourDetailRepository, author included."""
+    author = review.user
+    return {
+        'id': str(review.id),
+        'review': review.review,
+        'rating': review.rating,
+        'createdAt': review.created_at.isoformat() if review.created_at else None,
+        'user': {
+            'id': str(author.id),
+            'name': author.name,
+            'photo': author.photo,
+            'profileSlug': author.profile_slug
+        } if author else None
+    }
+
+
+tour_details = TourDetailRepository()
@@ -0,0 +1,171 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from bson import DBRef
+
+from models.userModel import User, Role
+from Utils.invalidationBus import invalidation_bus
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# How often the directory picks up users saved since the last sync (by updated_at), and how often it reloads
+# in full to drop users deleted by other processes (can be overridden via env vars)
+USER_DIRECTORY_SYNC_INTERVAL = float(os.getenv('USER_DIRECTORY_SYNC_INTERVAL', 30))
+USER_DIRECTORY_FULL_SYNC_INTERVAL = float(os.getenv('USER_DIRECTORY_FULL_SYNC_INTERVAL', 900))
+# Delta syncs overlap the previous one by this much to absorb clock skew between app servers
+USER_DIRECTORY_SYNC_OVERLAP = timedelta(seconds=float(os.getenv('USER_DIRECTORY_SYNC_OVERLAP', 5)))
+
+# Public profile fields only: no email, password hash or reset tokens
+DIRECTORY_FIELDS = ('id', 'name', 'role', 'photo', 'profile_slug', 'active', 'facebook', 'instagram', 'twitter')
+GUIDE_ROLES = (Role.GUIDE, Role.LEAD_GUIDE)
+
+
+class DirectoryEntry:
+    """Slim, read-only view of a user for public pages (guide listings, testimonial authors)."""
+    __slots__ = DIRECTORY_FIELDS
+
+    def __init__(self, user_doc):
+        self.id = user_doc['_id']
+        self.name = user_doc.get('name')
+        try:
+            self.role = Role(user_doc.get('role', Role.USER.value))
+        except ValueError:
+            self.role = user_doc['role']
+        self.photo = user_doc.get('photo', 'default.jpg')
+        self.profile_slug = user_doc.get('profile_slug')
+        self.active = user_doc.get('active', True)
+        self.facebook = user_doc.get('facebook')
+        self.instagram = user_doc.get('instagram')
+        self.twitter = user_doc.get('twitter')
+
+    def __repr__(self):
+        return f"<DirectoryEntry {self.id} {self.name}>"
+
+
+class UserDirectory:
+    """
+    In-process directory of every user's public profile, kept current by delta syncs.
+
+    Readers get the current snapshot without locking; a sync builds a new dict and swaps it in.
+    Syncs run on the first read after the interval, or after an invalidation bus event for a user,
+    so an idle process does no background work.
+    """
+
+    def __init__(self, sync_interval=USER_DIRECTORY_SYNC_INTERVAL, full_sync_interval=USER_DIRECTORY_FULL_SYNC_INTERVAL):
+        self.sync_interval = sync_interval
+        self.full_sync_interval = full_sync_interval
+        self._entries = {}
+        self._guides = []
+        self._synced_at = None
+        self._full_synced_at = None
+        self._watermark = None
+        self._lock = threading.Lock()
+        self._stats = {'full_syncs': 0, 'delta_syncs': 0, 'delta_changes': 0, 'sync_errors': 0}
+        invalidation_bus.subscribe('users', self._on_user_changed)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        # A fork taken mid-sync would leave the child's copy of the lock held forever
+        self._lock = threading.Lock()
+
+    def _on_user_changed(self, event):
+        if event.operation == 'delete':
+            self.discard(event.document_id)
+        elif event.document_id is None:
+            self._watermark = None  # full reload on the next read
+            self._synced_at = None
+        else:
+            self._synced_at = None  # delta sync on the next read
+
+    def _due(self, now):
+        return self._synced_at is None or now - self._synced_at >= self.sync_interval
+
+    def _sync_if_stale(self):
+        if not self._due(time.monotonic()):
+            return
+        with self._lock:
+            now = time.monotonic()
+            if not self._due(now):
+                return
+            try:
+                if self._watermark is None or now - self._full_synced_at >= self.full_sync_interval:
+                    self._full_sync()
+                    self._full_synced_at = now
+                else:
+                    self._delta_sync()
+            except Exception as e:
+                # Keep serving the last snapshot; the next read after the interval retries
+                self._stats['sync_errors'] += 1
+                logger.error(f"User directory sync failed: {e}")
+            self._synced_at = now
+
+    def _full_sync(self):
+        started = datetime.utcnow()
+        entries = {}
+        for user_doc in User.objects.only(*DIRECTORY_FIELDS).as_pymongo():
+            entries[str(user_doc['_id'])] = DirectoryEntry(user_doc)
+        self._publish(entries)
+        self._watermark = started
+        self._stats['full_syncs'] += 1
+        logger.info(f"Loaded {len(entries)} users into the user directory.")
+
+    def _delta_sync(self):
+        started = datetime.utcnow()
+        changed = list(
+            User.objects(updated_at__gte=self._watermark - USER_DIRECTORY_SYNC_OVERLAP)
+            .only(*DIRECTORY_FIELDS).as_pymongo()
+        )
+        if changed:
+            entries = dict(self._entries)
+            for user_doc in changed:
+                entries[str(user_doc['_id'])] = DirectoryEntry(user_doc)
+            self._publish(entries)
+        self._watermark = started
+        self._stats['delta_syncs'] += 1
+        self._stats['delta_changes'] += len(changed)
+
+    def _publish(self, entries):
+        guides = [entry for entry in entries.values() if entry.active and entry.role in GUIDE_ROLES]
+        # Same order as order_by('-role', 'name'): lead guides first, then by name
+        guides.sort(key=lambda entry: entry.name or '')
+        guides.sort(key=lambda entry: entry.role.value, reverse=True)
+        self._entries, self._guides = entries, guides
+
+    def reload(self):
+        """Rebuild the directory from MongoDB now, e.g. after a bulk import."""
+        with self._lock:
+            self._full_sync()
+            self._synced_at = self._full_synced_at = time.monotonic()
+
+    def get(self, user):
+        """Entry for a user id, ObjectId or DBRef (as held by an undereferenced ReferenceField), or None."""
+        if user is None:
+            return None
+        self._sync_if_stale()
+        if isinstance(user, DBRef):
+            user = user.id
+        return self._entries.get(str(user))
+
+    def guides(self):
+        """Active guides and lead guides, lead guides first, then by name."""
+        self._sync_if_stale()
+        return list(self._guides)
+
+    def discard(self, user_id):
+        """Forget a deleted user in this process without waiting for the next full sync."""
+        with self._lock:
+            entries = dict(self._entries)
+            if entries.pop(str(user_id), None) is not None:
+                self._publish(entries)
+
+    def stats(self) -> dict:
+        return {'users': len(self._entries), 'guides': len(self._guides), **self._stats}
+
+
+user_directory = UserDirectory()
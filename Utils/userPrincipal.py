@@ -0,0 +1,73 @@
+import os
+
+from flask import g
+
+from models.userModel import User
+from Utils.cache import LRUCache
+from Utils.invalidationBus import invalidation_bus
+
+# Per-process cache of the authenticated-user fields protect/is_logged_in need (can be overridden via env vars).
+# Entries are dropped on invalidation bus events for the user; the TTL bounds staleness if an event is missed.
+AUTH_USER_CACHE_SIZE = int(os.getenv('AUTH_USER_CACHE_SIZE', 4096))
+AUTH_USER_CACHE_TTL = float(os.getenv('AUTH_USER_CACHE_TTL', 60))
+
+PRINCIPAL_FIELDS = ('id', 'role', 'email', 'name', 'profile_slug', 'password_changed_at', 'active')
+
+principal_cache = LRUCache(max_items=AUTH_USER_CACHE_SIZE, ttl=AUTH_USER_CACHE_TTL)
+
+
+class UserPrincipal:
+    """The slim, read-only view of a user that authentication stores in g.user."""
+    __slots__ = PRINCIPAL_FIELDS
+
+    def __init__(self, user):
+        for field in PRINCIPAL_FIELDS:
+            setattr(self, field, getattr(user, field, None))
+
+    def changed_password_after(self, jwt_timestamp: int) -> bool:
+        if self.password_changed_at:
+            changed_timestamp = int(self.password_changed_at.timestamp())
+            return jwt_timestamp < changed_timestamp
+        return False
+
+    def __repr__(self):
+        return f"<UserPrincipal {self.id} {self.email}>"
+
+
+def get_user_principal(user_id):
+    """
+    Return the active user's principal, or None if there is no such active user.
+    Reuses g.user when this request already authenticated the same user, then the process cache, then MongoDB.
+    """
+    user_id = str(user_id)
+    current = getattr(g, 'user', None)
+    if isinstance(current, UserPrincipal) and str(current.id) == user_id:
+        return current
+
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        user = User.objects(id=user_id, active=True).only(*PRINCIPAL_FIELDS).first()
+        if not user:
+            return None
+        principal = UserPrincipal(user)
+        principal_cache.set(user_id, principal)
+    return principal
+
+
+def invalidate_user_principal(user_id):
+    """Drop a user's cached principal after a change to their password, role, profile or active flag."""
+    principal_cache.pop(str(user_id))
+
+
+def _on_user_changed(event):
+    if event.document_id is None:
+        principal_cache.clear()
+    else:
+        invalidate_user_principal(event.document_id)
+
+
+invalidation_bus.subscribe('users', _on_user_changed)
+
+
+def principal_cache_stats() -> dict:
+    return principal_cache.stats()
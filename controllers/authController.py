@@ -1,15 +1,17 @@
 import os
 from dotenv import load_dotenv
-from jose import jwt
-from jose.exceptions import JWTError, ExpiredSignatureError
 import hashlib
 import datetime
 from flask import request, jsonify, make_response, g, current_app, url_for
 from functools import wraps
-from mongoengine import ValidationError
+from mongoengine import ValidationError, NotUniqueError
 from models.userModel import User, Role
 from Utils.AppError import AppError
 from Utils.email import Email
+from Utils.jwtTokens import encode_token, decode_token, TokenExpiredError, TokenInvalidError
+from Utils.userPrincipal import get_user_principal, invalidate_user_principal
+from Utils.passwordHashing import hash_password, needs_rehash
+from Utils.invalidationBus import invalidation_bus
 
 import logging
 #is_prod = current_app.config.get('ENV') == 'production'
@@ -23,10 +25,15 @@ logging.basicConfig(level=logging.INFO)
 # Load environment variables
 load_dotenv()
 
-# Validate environment variables
-JWT_SECRET = os.getenv('JWT_SECRET')
-if not JWT_SECRET:
-    raise ValueError("JWT_SECRET environment variable is not set")
+
+def get_jwt_secret():
+    # Read on use rather than at import so tooling can import the controllers without the secret;
+    # create_app() calls this once so a misconfigured server still fails at startup
+    jwt_secret = os.getenv('JWT_SECRET')
+    if not jwt_secret:
+        raise ValueError("JWT_SECRET environment variable is not set")
+    return jwt_secret
+
 
 JWT_COOKIE_EXPIRES_IN = os.getenv('JWT_COOKIE_EXPIRES_IN', '90')
 try:
@@ -46,7 +53,7 @@ def sign_token(user_id: str) -> str:
             'iat': int(datetime.datetime.utcnow().timestamp()),
             'exp': int((datetime.datetime.utcnow() + datetime.timedelta(days=JWT_COOKIE_EXPIRES_IN)).timestamp())
         }
-        return jwt.encode(payload, JWT_SECRET, algorithm='HS256')
+        return encode_token(payload, get_jwt_secret())
     except AttributeError as e:
         logger.error(f"JWT encode failed: {str(e)}")
         raise AppError("Token generation failed: Invalid JWT library", 500)
@@ -126,11 +133,6 @@ def signup():
             logger.warning("Signup attempt with admin role")
             raise AppError("Cannot assign admin role during signup", 403)
 
-        # Check if email already exists
-        if User.objects(email=data.get('email')).first():
-            logger.warning(f"Signup attempt with existing email: {data.get('email')}")
-            raise AppError("Email already exists", 400)
-
         # Remove fields that should be system-generated
         data.pop('profile_slug', None)  # Let model generate HashID-based profile_slug
         data.pop('passwordConfirm', None)  # Not stored in model
@@ -143,7 +145,12 @@ def signup():
             role=role
         )
         logger.debug(f"New user before save: name={new_user.name}, email={new_user.email}, role={new_user.role}")
-        new_user.save()
+        # A single insert; the unique email index reports an existing account
+        try:
+            new_user.save()
+        except NotUniqueError:
+            logger.warning(f"Signup attempt with existing email: {data.get('email')}")
+            raise AppError("Email already exists", 400)
 
         # Send welcome email (non-critical)
         try:
@@ -186,6 +193,15 @@ def login():
             logger.warning(f"Failed login attempt for email: {email}")
             raise AppError('Incorrect email or password', 401)
 
+        # Upgrade hashes made with an older BCRYPT_ROUNDS while the plain password is at hand
+        if needs_rehash(user.password):
+            user.password = hash_password(password)
+            # A queryset write skips User.save(): stamp updated_at and announce it like the other user updates
+            User.objects(id=user.id).update_one(set__password=user.password,
+                                                set__updated_at=datetime.datetime.utcnow())
+            invalidation_bus.notify('users', user.id)
+            logger.info(f"Rehashed password for user {user.email} with the current work factor")
+
         logger.info(f"User logged in successfully: {user.email}")
         return create_send_token(user, 200)
     except AppError as e:
@@ -211,7 +227,7 @@ def logout():
 
 def protect(f):
     """
-    Decorator to protect routes: verify JWT token and set g.user.
+    Decorator to protect routes: verify JWT token and set g.user to the cached UserPrincipal.
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -229,13 +245,13 @@ def protect(f):
                 logger.warning("Access attempt without token")
                 raise AppError('You are not logged in! Please log in to get access.', 401)
 
-            # Verify token
+            # Verify token (claims of an already verified token come from the decode cache)
             logger.debug(f"Decoding token: {token}")
-            decoded = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+            decoded = decode_token(token, get_jwt_secret())
             logger.debug(f"Token decoded: {decoded}")
 
-            # Check if user exists
-            current_user = User.objects(id=decoded['id'], active=True).first()
+            # Check if user exists (cached principal, shared with is_logged_in within the request)
+            current_user = get_user_principal(decoded['id'])
             if not current_user:
                 logger.warning(f"Token refers to non-existent user: {decoded['id']}")
                 raise AppError('The user belonging to this token does no longer exist.', 401)
@@ -251,10 +267,10 @@ def protect(f):
 
             # Call the original function
             return f(*args, **kwargs)
-        except ExpiredSignatureError:
+        except TokenExpiredError:
             logger.warning("Access attempt with expired token")
             raise AppError('Your token has expired! Please log in again.', 401)
-        except JWTError as e:
+        except TokenInvalidError as e:
             logger.warning(f"Access attempt with invalid token: {str(e)}")
             raise AppError('Invalid token! Please log in again.', 401)
         except AppError as e:
@@ -274,10 +290,10 @@ def is_logged_in(f):
         if 'jwt' in request.cookies:
             try:
                 # Verify token
-                decoded = jwt.decode(request.cookies.get('jwt'), JWT_SECRET, algorithms=['HS256'])
+                decoded = decode_token(request.cookies.get('jwt'), get_jwt_secret())
 
                 # Check if user exists
-                current_user = User.objects(id=decoded['id'], active=True).first()
+                current_user = get_user_principal(decoded['id'])
                 if not current_user:
                     logger.warning(f"Token refers to non-existent user in is_logged_in: {decoded['id']}")
                     return f(*args, **kwargs)  # Proceed without setting g.user
@@ -290,9 +306,9 @@ def is_logged_in(f):
                 # Set user in g
                 g.user = current_user
                 logger.debug(f"User authenticated in is_logged_in: {current_user.email}")
-            except jwt.ExpiredSignatureError:
+            except TokenExpiredError:
                 logger.warning("Expired token in is_logged_in")
-            except jwt.InvalidTokenError:
+            except TokenInvalidError:
                 logger.warning("Invalid token in is_logged_in")
         return f(*args, **kwargs)  # Always proceed to the view function
     return decorated_function
@@ -405,6 +421,7 @@ def reset_password():
         user.password_reset_token = None
         user.password_reset_expires = None
         user.save()
+        invalidate_user_principal(user.id)
 
         logger.info(f"Password reset successfully for user: {user.email}")
         return create_send_token(user, 200, request)
@@ -449,6 +466,7 @@ def update_password():
         user.password = password
         user.password_confirm = password_confirm
         user.save()
+        invalidate_user_principal(user.id)
 
         logger.info(f"Password updated successfully for user: {user.email}")
         return create_send_token(user, 200, request)
@@ -6,7 +6,7 @@ from models.tourModel import Tour
 from models.userModel import User
 from models.bookingModel import Booking
 from Utils.AppError import AppError
-from Utils.apiFeature import APIFeatures
+from Utils.apiFeature import QueryPlan
 from bson import ObjectId
 import logging
 from datetime import datetime
@@ -93,25 +93,20 @@ def get_all_bookings():
         logger.debug(f"Collection name for Booking: {Booking._get_collection().name}")
         query_string = getattr(request, 'modified_args', None) or request.args.to_dict()
         logger.debug(f"Query string: {query_string}")
-        features = APIFeatures(query, query_string)
-        features = features.filter()
-        logger.debug(f"After filter: {features.query.count()}")
-        features = features.sort()
-        logger.debug(f"After sort: {features.query.count()}")
-        features = features.limit_fields()
-        logger.debug(f"After limit_fields: {features.query.count()}")
-        features = features.paginate()
-        logger.debug(f"After paginate: {features.query.count()}")
-        docs = list(features.query)
+        plan = QueryPlan(query, query_string)
+        docs = plan.execute()
 
         logger.debug(f"Final bookings count: {len(docs)}")
-        return jsonify({
+        body = {
             "status": "success",
             "results": len(docs),
             "data": {
                 "data": [doc.to_json() for doc in docs]
             }
-        }), 200
+        }
+        if plan.total is not None:
+            body["total"] = plan.total
+        return jsonify(body), 200
     except AppError as e:
         raise e
     except Exception as e:
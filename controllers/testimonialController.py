@@ -4,7 +4,7 @@ from flask import request, jsonify, g
 from models.testimonialModel import Testimonial
 from models.userModel import User
 from Utils.AppError import AppError
-from Utils.apiFeature import APIFeatures
+from Utils.apiFeature import QueryPlan
 from bson import ObjectId
 import logging
 
@@ -66,20 +66,22 @@ def get_all_testimonials():
     try:
         query = Testimonial.objects(__raw__={})
         query_string = getattr(request, 'modified_args', None) or request.args.to_dict()
-        features = APIFeatures(query, query_string)
-        features = features.filter().sort().limit_fields().paginate()
-        docs = list(features.query)
+        plan = QueryPlan(query, query_string)
+        docs = plan.execute()
 
         # Populate user data for each testimonial
         docs = [doc.populate() for doc in docs]
 
-        return jsonify({
+        body = {
             "status": "success",
             "results": len(docs),
             "data": {
                 "data": [doc.to_json() for doc in docs]
             }
-        }), 200
+        }
+        if plan.total is not None:
+            body["total"] = plan.total
+        return jsonify(body), 200
     except AppError as e:
         raise e
     except Exception as e:
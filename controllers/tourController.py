@@ -1,12 +1,14 @@
 import traceback
 
-from flask import request, jsonify
-from PIL import Image
+from flask import request, jsonify, after_this_request
 import os
 from models.tourModel import Tour
-from models.reviewModel import Review
 from Utils.AppError import AppError
-from Utils.apiFeature import APIFeatures
+from Utils.apiFeature import QueryPlan
+from Utils.imageJobs import render_tour_image, staging_filename, submit_image_jobs, validate_upload
+from Utils.tourDetailRepository import (TOUR_REVIEWS_MAX_PAGE_SIZE, TOUR_REVIEWS_PAGE_SIZE, encode_review_cursor,
+                                         review_to_json, tour_details)
+from db import db
 import uuid
 from functools import wraps
 from bson import ObjectId
@@ -20,8 +22,6 @@ logger = logging.getLogger(__name__)
 
 # Configure upload settings
 UPLOAD_FOLDER = 'public/img/tours'
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
 
 
 # Utility functions from handlerFactory
@@ -101,6 +101,7 @@ def upload_tour_images():
 
 
 # Resize images (replacing sharp)
+# The originals are staged right away; the 2000x1333 images and renditions are rendered in the image worker pool
 def resize_tour_images():
     def decorator(f):
         @wraps(f)
@@ -111,30 +112,49 @@ def resize_tour_images():
                     logger.debug("No images to resize")
                     return f(*args, **kwargs)
 
-                tour_id = request.args.get('id') or (request.json or {}).get('id')
+                tour_id = kwargs.get('id') or request.args.get('id') or (request.get_json(silent=True) or {}).get('id')
                 if not tour_id:
                     logger.warning("No tour ID provided for image resizing")
                     raise AppError('Tour ID is required for image uploads.', 400)
 
-                image_cover_file = request.files_dict['imageCover']
-                filename_cover = f"tour-{tour_id}-{uuid.uuid4().hex}-cover.jpeg"
-                image_cover = Image.open(image_cover_file)
-                image_cover = image_cover.resize((2000, 1333), Image.Resampling.LANCZOS)
-                image_cover.save(os.path.join(UPLOAD_FOLDER, filename_cover), 'JPEG', quality=90)
-
-                images_filenames = []
+                uploads = [(f"tour-{tour_id}-{uuid.uuid4().hex}-cover.jpeg", request.files_dict['imageCover'])]
                 for i, image_file in enumerate(request.files_dict['images']):
-                    filename = f"tour-{tour_id}-{uuid.uuid4().hex}-{i + 1}.jpeg"
-                    image = Image.open(image_file)
-                    image = image.resize((2000, 1333), Image.Resampling.LANCZOS)
-                    image.save(os.path.join(UPLOAD_FOLDER, filename), 'JPEG', quality=90)
-                    images_filenames.append(filename)
-
-                request.json = request.json or {}
-                request.json['imageCover'] = filename_cover
-                request.json['images'] = images_filenames
+                    uploads.append((f"tour-{tour_id}-{uuid.uuid4().hex}-{i + 1}.jpeg", image_file))
+                # Checked before anything is stored, so a bad file fails the request instead of the render job
+                originals = []
+                for filename, image_file in uploads:
+                    image_data = image_file.read()
+                    validate_upload(image_file.filename or filename, image_data)
+                    originals.append((filename, image_data))
+
+                totals = db.save_images_bulk('imgs', [
+                    (staging_filename(filename), image_data, {'type': 'tour_image_upload'})
+                    for filename, image_data in originals
+                ])
+                if totals['failed']:
+                    raise AppError("Failed to save tour images to database", 500)
+
+                job = uuid.uuid4().hex
+                filenames = [filename for filename, _ in originals]
+
+                @after_this_request
+                def queue_tour_image_jobs(response):
+                    # Only once the tour document records the pending job, so its completion always finds it
+                    if response.status_code < 400:
+                        submit_image_jobs(
+                            [(render_tour_image, original) for original in originals],
+                            lambda results, errors: finish_tour_image_jobs(tour_id, job, filenames, results, errors)
+                        )
+                    return response
+
+                request.tour_images = {
+                    'imageCover': filenames[0],
+                    'images': filenames[1:],
+                    'imagesStatus': 'processing',
+                    'imagesJob': job
+                }
 
-                logger.info(f"Resized and saved tour images: {filename_cover}, {images_filenames}")
+                logger.info(f"Staged tour images {filenames}, rendering queued as job {job}")
                 return f(*args, **kwargs)
             except AppError as e:
                 raise e
@@ -147,6 +167,39 @@ def resize_tour_images():
     return decorator
 
 
+# Store rendered tour images with their renditions, then flip the tour's images_status
+def finish_tour_image_jobs(tour_id, job, filenames, results, errors):
+    failed = [filename for filename, error in zip(filenames, errors) if error is not None]
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    for filename, images in zip(filenames, results):
+        if images is None:
+            continue
+        try:
+            with open(os.path.join(UPLOAD_FOLDER, filename), 'wb') as f:
+                f.write(images[0][1])
+            if db.save_images_bulk('imgs', images)['failed']:
+                failed.append(filename)
+        except Exception as e:
+            logger.error(f"Storing rendered tour image {filename} failed: {str(e)}")
+            failed.append(filename)
+
+    # Failed uploads keep their staged original for inspection
+    db.delete_images('imgs', [staging_filename(filename) for filename in filenames if filename not in failed])
+    status = 'failed' if failed else 'ready'
+    # The job id is unique, so this also finds tours created under an id other than the one in the filenames
+    Tour.objects(images_job=job).update_one(set__images_status=status, unset__images_job=True)
+    if failed:
+        logger.error(f"Rendering tour images failed for {failed}")
+    logger.info(f"Tour {tour_id} images job {job} finished: {status}")
+
+
+# Request body of create/update, including filenames produced by resize_tour_images
+def tour_request_data():
+    data = dict(request.get_json(silent=True) or {})
+    data.update(getattr(request, 'tour_images', {}))
+    return data
+
+
 # Middleware to alias top tours
 def alias_top_tours():
     def decorator(f):
@@ -173,29 +226,24 @@ def get_all_tours():
         if 'tourId' in request.args:
             filter_kwargs['tour'] = request.args.get('tourId')
 
-        query = Tour.objects(__raw__={**filter_kwargs})
+        query = Tour.catalogue(__raw__={**filter_kwargs})
         logger.debug(f"Collection name for Tour: {Tour._get_collection().name}")
         query_string = getattr(request, 'modified_args', None) or request.args.to_dict()
         logger.debug(f"Query string: {query_string}")
-        features = APIFeatures(query, query_string)
-        features = features.filter()
-        logger.debug(f"After filter: {features.query.count()}")
-        features = features.sort()
-        logger.debug(f"After sort: {features.query.count()}")
-        features = features.limit_fields()
-        logger.debug(f"After limit_fields: {features.query.count()}")
-        features = features.paginate()
-        logger.debug(f"After paginate: {features.query.count()}")
-        docs = list(features.query)
+        plan = QueryPlan(query, query_string)
+        docs = plan.execute()
 
         logger.debug(f"Final tours count: {len(docs)}")
-        return jsonify({
+        body = {
             "status": "success",
             "results": len(docs),
             "data": {
                 "data": [doc.to_json() for doc in docs]
             }
-        }), 200
+        }
+        if plan.total is not None:
+            body["total"] = plan.total
+        return jsonify(body), 200
     except AppError as e:
         raise e
     except Exception as e:
@@ -239,7 +287,7 @@ def get_one_tour(id):
 
 def create_one_tour():
     try:
-        data = request.get_json()
+        data = tour_request_data()
         logger.debug(f"Incoming create data: {data}")
         data = transform_data(data)
         logger.debug(f"Transformed create data: {data}")
@@ -258,7 +306,7 @@ def create_one_tour():
 
 def update_one_tour(id):
     try:
-        data = request.get_json()
+        data = tour_request_data()
         if not data:
             raise AppError("No data provided for update", 400)
         data = transform_data(data)
@@ -411,17 +459,17 @@ def get_tours_within():
 
         radius = distance / 6378.1 if unit == 'km' else distance / 3963.2
 
-        tours = Tour.objects(__raw__={
+        tours = list(Tour.catalogue(__raw__={
             "start_location": {
                 "$geoWithin": {
                     "$centerSphere": [[lng, lat], radius]
                 }
             }
-        })
-        logger.info(f"Retrieved {tours.count()} tours within {distance} {unit} of ({lat}, {lng})")
+        }))
+        logger.info(f"Retrieved {len(tours)} tours within {distance} {unit} of ({lat}, {lng})")
         return jsonify({
             "status": "success",
-            "results": tours.count(),
+            "results": len(tours),
             "data": {"data": [tour.to_json() for tour in tours]}
         }), 200
     except AppError as e:
@@ -472,23 +520,38 @@ def get_distances():
 
 def debug_tours():
     try:
-        tours = Tour.objects(secret_tour__ne=True)
-        logger.info(f"Debug (standard): Found {tours.count()} non-secret tours")
+        tours = list(Tour.objects(secret_tour__ne=True))
+        logger.info(f"Debug (standard): Found {len(tours)} non-secret tours")
 
-        raw_tours = Tour.objects(__raw__={'secretTour': {'$ne': True}})
-        logger.info(f"Debug (raw): Found {raw_tours.count()} non-secret tours")
+        raw_tours = list(Tour.objects(__raw__={'secretTour': {'$ne': True}}))
+        logger.info(f"Debug (raw): Found {len(raw_tours)} non-secret tours")
 
         return jsonify({
             "status": "success",
-            "results": tours.count(),
+            "results": len(tours),
             "data": {"data": [tour.to_json() for tour in tours]},
-            "raw_results": raw_tours.count(),
+            "raw_results": len(raw_tours),
             "raw_data": [tour.to_json() for tour in raw_tours]
         }), 200
     except Exception as e:
         logger.error(f"Debug error: {str(e)}")
         raise AppError(str(e), 500)
 
+# ?review_page=&review_limit= on the tour detail endpoints, bounded like /<id>/reviews:
+# every review embedded in the one aggregation result could otherwise outgrow the 16 MB document limit
+def review_page_params():
+    review_limit = request.args.get('review_limit', TOUR_REVIEWS_PAGE_SIZE, type=int)
+    review_page = max(request.args.get('review_page', 1, type=int), 1)
+    if not 1 <= review_limit <= TOUR_REVIEWS_MAX_PAGE_SIZE:
+        raise AppError(f'review_limit must be between 1 and {TOUR_REVIEWS_MAX_PAGE_SIZE}', 400)
+    return (review_page - 1) * review_limit, review_limit
+
+# Cursor for GET /api/v1/tours/<id>/reviews continuing after the embedded reviews, None when there are no more
+def reviews_next_cursor(doc, page_reviews, review_skip):
+    if page_reviews and doc.reviews_count > review_skip + len(page_reviews):
+        return encode_review_cursor(page_reviews[-1])
+    return None
+
 def get_tour(id):
     try:
         logger.debug(f"Incoming ID from URL: {id} (type: {type(id)})")
@@ -501,29 +564,27 @@ def get_tour(id):
         logger.debug(f"Converted ObjectId: {object_id} (type: {type(object_id)})")
         logger.debug(f"Querying collection: {Tour._get_collection().name}")
 
-        doc = Tour.objects(id=object_id).first()
+        review_skip, review_limit = review_page_params()
+        doc = tour_details.by_id(object_id, review_skip, review_limit)
         if not doc:
             logger.debug("Document not found")
             raise AppError('No tour found with that ID', 404)
-        doc = doc.populate_guides()
-        # Manually fetch and populate reviews
-        reviews = Review.objects(tour=doc.id)
+        populated_reviews = doc.reviews
         doc.reviews = []
-        for review in reviews:
-            populated_review = review.populate()
+        for populated_review in populated_reviews:
             if populated_review.user and hasattr(populated_review.user, 'name') and hasattr(populated_review.user, 'photo'):
                 if isinstance(populated_review.created_at, datetime):
                     doc.reviews.append(populated_review)
                 else:
-                    logger.warning(f"Skipping review {review.id}: invalid created_at {populated_review.created_at}")
+                    logger.warning(f"Skipping review {populated_review.id}: invalid created_at {populated_review.created_at}")
             else:
-                logger.warning(f"Skipping review {review.id} for tour {doc.id}: missing user data")
+                logger.warning(f"Skipping review {populated_review.id} for tour {doc.id}: missing user data")
         logger.debug(f"Loaded {len(doc.reviews)} valid reviews for tour {doc.id}")
 
-        # Validate startDates
-        if not doc.startDates or not isinstance(doc.startDates[0], datetime):
-            logger.warning(f"Tour {doc.id} has invalid startDates: {doc.startDates}")
-            doc.startDates = [datetime.utcnow()]
+        # Validate start_dates
+        if not doc.start_dates or not isinstance(doc.start_dates[0], datetime):
+            logger.warning(f"Tour {doc.id} has invalid start_dates: {doc.start_dates}")
+            doc.start_dates = [datetime.utcnow()]
 
         # Validate start_location
         if not doc.start_location or not hasattr(doc.start_location, 'description'):
@@ -532,7 +593,9 @@ def get_tour(id):
 
         # Include reviews in JSON response
         tour_data = doc.to_json()
-        tour_data['reviews'] = [review.to_json() for review in doc.reviews]
+        tour_data['reviews'] = [review_to_json(review) for review in doc.reviews]
+        tour_data['reviewsCount'] = doc.reviews_count
+        tour_data['reviewsNextCursor'] = reviews_next_cursor(doc, populated_reviews, review_skip)
         return jsonify({
             "status": "success",
             "data": {
@@ -548,29 +611,27 @@ def get_tour(id):
 def get_tour_by_slug(slug):
     try:
         logger.debug(f"Incoming slug from URL: {slug} (type: {type(slug)})")
-        doc = Tour.objects(slug=slug, secret_tour__ne=True).first()
+        review_skip, review_limit = review_page_params()
+        doc = tour_details.by_slug(slug, review_skip, review_limit)
         if not doc:
             logger.debug("Document not found")
             raise AppError('No tour found with that slug', 404)
-        doc = doc.populate_guides()
-        # Manually fetch and populate reviews
-        reviews = Review.objects(tour=doc.id)
+        populated_reviews = doc.reviews
         doc.reviews = []
-        for review in reviews:
-            populated_review = review.populate()
+        for populated_review in populated_reviews:
             if populated_review.user and hasattr(populated_review.user, 'name') and hasattr(populated_review.user, 'photo'):
                 if isinstance(populated_review.created_at, datetime):
                     doc.reviews.append(populated_review)
                 else:
-                    logger.warning(f"Skipping review {review.id}: invalid created_at {populated_review.created_at}")
+                    logger.warning(f"Skipping review {populated_review.id}: invalid created_at {populated_review.created_at}")
             else:
-                logger.warning(f"Skipping review {review.id} for tour {doc.id}: missing user data")
+                logger.warning(f"Skipping review {populated_review.id} for tour {doc.id}: missing user data")
         logger.debug(f"Loaded {len(doc.reviews)} valid reviews for tour {slug}")
 
-        # Validate startDates
-        if not doc.startDates or not isinstance(doc.startDates[0], datetime):
-            logger.warning(f"Tour {slug} has invalid startDates: {doc.startDates}")
-            doc.startDates = [datetime.utcnow()]
+        # Validate start_dates
+        if not doc.start_dates or not isinstance(doc.start_dates[0], datetime):
+            logger.warning(f"Tour {slug} has invalid start_dates: {doc.start_dates}")
+            doc.start_dates = [datetime.utcnow()]
 
         # Validate start_location
         if not doc.start_location or not hasattr(doc.start_location, 'description'):
@@ -579,7 +640,9 @@ def get_tour_by_slug(slug):
 
         # Include reviews in JSON response
         tour_data = doc.to_json()
-        tour_data['reviews'] = [review.to_json() for review in doc.reviews]
+        tour_data['reviews'] = [review_to_json(review) for review in doc.reviews]
+        tour_data['reviewsCount'] = doc.reviews_count
+        tour_data['reviewsNextCursor'] = reviews_next_cursor(doc, populated_reviews, review_skip)
         return jsonify({
             "status": "success",
             "data": {
@@ -592,6 +655,60 @@ def get_tour_by_slug(slug):
         logger.error(f"Error in get_tour_by_slug: {str(e)}\n{traceback.format_exc()}")
         raise AppError(str(e), 500)
 
+# "Load more" reviews: ?cursor= is the nextCursor of the previous page, omitted for the newest reviews
+def get_tour_reviews(id):
+    try:
+        try:
+            object_id = ObjectId(id)
+        except Exception:
+            raise AppError("Invalid ID format", 400)
+        limit = request.args.get('limit', TOUR_REVIEWS_PAGE_SIZE, type=int)
+        if not 1 <= limit <= TOUR_REVIEWS_MAX_PAGE_SIZE:
+            raise AppError(f'limit must be between 1 and {TOUR_REVIEWS_MAX_PAGE_SIZE}', 400)
+        if not Tour.catalogue(id=object_id, secret_tour__ne=True).only('id').first():
+            raise AppError('No tour found with that ID', 404)
+        try:
+            reviews, next_cursor = tour_details.reviews_after(object_id, request.args.get('cursor'), limit)
+        except ValueError as e:
+            raise AppError(str(e), 400)
+        return jsonify({
+            "status": "success",
+            "results": len(reviews),
+            "data": {
+                "reviews": [review_to_json(review) for review in reviews],
+                "nextCursor": next_cursor
+            }
+        }), 200
+    except AppError as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Error in get_tour_reviews: {str(e)}")
+        raise AppError(str(e), 500)
+
+# Poll the background rendering of a tour's uploaded images
+def get_tour_images_status(id):
+    try:
+        try:
+            object_id = ObjectId(id)
+        except Exception:
+            raise AppError("Invalid ID format", 400)
+        doc = Tour.objects(id=object_id).only('image_cover', 'images', 'images_status').first()
+        if not doc:
+            raise AppError('No tour found with that ID', 404)
+        return jsonify({
+            "status": "success",
+            "data": {
+                "imagesStatus": doc.images_status,
+                "imageCover": doc.image_cover,
+                "images": doc.images
+            }
+        }), 200
+    except AppError as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Error in get_tour_images_status: {str(e)}")
+        raise AppError(str(e), 500)
+
 # Route handlers (updated to use local functions with decorators)
 get_all_tours = get_all_tours
 get_tour = get_one_tour
@@ -1,5 +1,4 @@
-from flask import request, jsonify, g, send_file, render_template
-from PIL import Image
+from flask import request, jsonify, g, send_file, render_template, after_this_request
 import io
 import os
 import uuid
@@ -8,7 +7,10 @@ from mongoengine import ValidationError
 
 from models.userModel import User, Role
 from Utils.AppError import AppError
-from Utils.apiFeature import APIFeatures
+from Utils.apiFeature import QueryPlan
+from Utils.httpCache import REVALIDATE_CACHE_CONTROL, is_not_modified, not_modified_response, apply_validators
+from Utils.imageVariants import avatar_format_for, render_avatar_variant, resolve_avatar_size
+from Utils.imageJobs import render_user_photo, staging_filename, submit_image_jobs, validate_upload
 from functools import wraps
 from bson import ObjectId
 import logging
@@ -16,15 +18,15 @@ from datetime import datetime
 from dateutil import parser
 from db import db
 from controllers.authController import create_send_token
+from Utils.invalidationBus import invalidation_bus
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Configure upload settings (optional, will be used only temporarily if keeping filesystem storage)
+# Created by create_app() in main.py
 UPLOAD_FOLDER = 'public/img/users'
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
 
 
 # Utility functions from handlerFactory
@@ -104,6 +106,7 @@ def upload_user_photo():
 
 
 # Resize photo (replacing sharp)
+# The original is staged right away; the 500x500 photo and avatar variants are rendered in the image worker pool
 def resize_user_photo():
     def decorator(f):
         @wraps(f)
@@ -112,31 +115,37 @@ def resize_user_photo():
                 if not hasattr(request, 'file'):
                     logger.debug("No file to resize")
                     return f(*args, **kwargs)
+                if hasattr(request, 'file_filename'):
+                    # update_me is wrapped both at its definition and in the route; store the upload once
+                    return f(*args, **kwargs)
 
                 photo_file = request.file
                 mime_type = photo_file.mimetype
-                save_format = 'PNG' if mime_type == 'image/png' else 'JPEG'
                 file_extension = 'png' if mime_type == 'image/png' else 'jpeg'
                 filename = f"user-{g.user.id}-{uuid.uuid4().hex}.{file_extension}"
 
-                photo = Image.open(photo_file)
-
-                if photo.mode == 'RGBA' and save_format == 'JPEG':
-                    photo = photo.convert('RGB')
-
-                photo = photo.resize((500, 500), Image.Resampling.LANCZOS)
-
-                img_byte_arr = io.BytesIO()
-                photo.save(img_byte_arr, format=save_format, quality=90 if save_format == 'JPEG' else None)
-                image_data = img_byte_arr.getvalue()
-
-                success = db.save_image(filename, image_data)
+                image_data = photo_file.read()
+                # Checked before it is stored, so a bad file fails the request instead of the render job
+                validate_upload(photo_file.filename or filename, image_data)
+                success = db.save_image(staging_filename(filename), image_data)
                 if not success:
                     logger.error(f"Failed to save image {filename} to user_imgs collection")
                     raise AppError("Failed to save image to database", 500)
 
+                user_id = g.user.id
+
+                @after_this_request
+                def queue_photo_job(response):
+                    # Only once update_me has recorded the pending job, so its completion always finds it
+                    if response.status_code < 400:
+                        submit_image_jobs(
+                            [(render_user_photo, (filename, image_data))],
+                            lambda results, errors: finish_user_photo_job(user_id, filename, results[0], errors[0])
+                        )
+                    return response
+
                 request.file_filename = filename
-                logger.info(f"Photo resized and saved to tourist_db.user_imgs as {filename}")
+                logger.info(f"Photo staged in tourist_db.user_imgs for {filename}, rendering queued")
                 return f(*args, **kwargs)
             except AppError as e:
                 raise e
@@ -149,6 +158,28 @@ def resize_user_photo():
     return decorator
 
 
+# Store the rendered photo and avatar variants, then flip the user's photo_status
+def finish_user_photo_job(user_id, filename, result, error):
+    pending = User.objects(id=user_id, photo_job=filename)
+    if error is None:
+        try:
+            photo, variants = result
+            save_format, _ = avatar_format_for(filename)
+            db.save_image(filename, photo, overwrite=True)
+            for size, variant in variants.items():
+                db.save_user_image_variant(filename, size, save_format, variant)
+        except Exception as e:
+            error = e
+    if error is not None:
+        logger.error(f"Rendering photo {filename} failed: {str(error)}")
+        pending.update_one(set__photo_status='failed', unset__photo_job=True)
+        return
+    # Failed uploads keep their staged original for inspection
+    db.delete_images('user_imgs', [staging_filename(filename)])
+    pending.update_one(set__photo_status='ready', unset__photo_job=True)
+    logger.info(f"Photo {filename} rendered for user {user_id}")
+
+
 # Helper function to filter object fields
 def filter_obj(obj, *allowed_fields):
     return {key: obj[key] for key in obj if key in allowed_fields}
@@ -176,7 +207,10 @@ def get_current_user_data():
         logger.warning("Attempt to get current user data without authenticated user")
         raise AppError('You must be logged in to access this resource', 401)
 
-    user = g.user
+    # g.user is only the cached auth principal; photo and location live on the document
+    user = User.objects(id=g.user.id).only('email', 'name', 'photo', 'location', 'profile_slug').first()
+    if not user:
+        raise AppError('No user found with that ID', 404)
     logger.debug(f"Formatting user data for: {user.email}")
     photo_url = f"/api/v1/users/image/{str(user.id)}" if user.photo else None
     return jsonify({
@@ -193,6 +227,21 @@ def get_current_user_data():
         }
     }), 200
 
+# Poll the background rendering of the current user's uploaded photo
+def get_my_photo_status():
+    if not hasattr(g, 'user'):
+        raise AppError('You must be logged in to access this resource', 401)
+    user = User.objects(id=g.user.id).only('photo', 'photo_status').first()
+    if not user:
+        raise AppError('No user found with that ID', 404)
+    return jsonify({
+        "status": "success",
+        "data": {
+            "photo": user.photo,
+            "photo_status": user.photo_status
+        }
+    }), 200
+
 # New handler to check if an email exists
 def check_email():
     try:
@@ -223,15 +272,11 @@ def get_all_users():
         query = User.objects()
         query_string = getattr(request, 'modified_args', None) or request.args.to_dict()
         logger.debug(f"Query string: {query_string}")
-        features = APIFeatures(query, query_string)
-        features = features.filter()
-        features = features.sort()
-        features = features.limit_fields()
-        features = features.paginate()
-        docs = list(features.query)
+        plan = QueryPlan(query, query_string)
+        docs = plan.execute()
 
         logger.debug(f"Final users count: {len(docs)}")
-        return jsonify({
+        body = {
             "status": "success",
             "results": len(docs),
             "data": {
@@ -247,7 +292,10 @@ def get_all_users():
                     } for doc in docs
                 ]
             }
-        }), 200
+        }
+        if plan.total is not None:
+            body["total"] = plan.total
+        return jsonify(body), 200
     except AppError as e:
         raise e
     except Exception as e:
@@ -366,7 +414,8 @@ def update_one_user(id):
         doc = User.objects(id=object_id).first()
         if not doc:
             raise AppError('No user found with that ID', 404)
-        doc.update(**data)
+        doc.update(**data, updated_at=datetime.utcnow())
+        invalidation_bus.notify('users', object_id)
         updated_doc = User.objects(id=object_id).first()
         return jsonify({
             "status": "success",
@@ -395,7 +444,7 @@ def delete_one_user(id):
             logger.debug("Document not found")
             raise AppError('No user found with that ID', 404)
 
-        doc.delete()
+        doc.delete()  # post_delete notifies the invalidation bus
         logger.debug(f"Deleted user with ID: {id}")
         return jsonify({
             "status": "success",
@@ -441,6 +490,8 @@ def update_me():
 
         if hasattr(request, 'file_filename'):
             filtered_body['photo'] = request.file_filename
+            filtered_body['photo_status'] = 'processing'
+            filtered_body['photo_job'] = request.file_filename
             logger.debug(f"Photo included: {filtered_body['photo']}")
 
         if 'password' in filtered_body:
@@ -462,8 +513,9 @@ def update_me():
             raise AppError('No user found with that ID', 404)
 
         if filtered_body:
-            user.update(**filtered_body)
+            user.update(**filtered_body, updated_at=datetime.utcnow())
             logger.debug(f"Updated fields: {filtered_body}")
+        invalidation_bus.notify('users', user.id)
 
         updated_user = User.objects(id=g.user.id).first()
 
@@ -490,7 +542,8 @@ def delete_me():
         if not user:
             logger.warning(f"No user found with ID {g.user.id}")
             raise AppError('No user found with that ID', 404)
-        user.update(active=False)
+        user.update(active=False, updated_at=datetime.utcnow())
+        invalidation_bus.notify('users', user.id)
         logger.info(f"User deactivated: {user.email}")
         return jsonify({
             "status": "success",
@@ -523,46 +576,42 @@ def serve_user_image(profile_slug):  # Change parameter to profile_slug
         photo_filename = user.photo
         logger.debug(f"Photo filename for user {profile_slug}: {photo_filename}")
 
-        collection = db.get_user_imgs_collection()
-        image_doc = collection.find_one({"filename": photo_filename})
-        if not image_doc:
-            raise AppError(f"Image {photo_filename} not found in user_imgs collection", 404)
-
-        image_data = image_doc['data']
-        if not isinstance(image_data, bytes):
-            raise AppError(f"Image data for {photo_filename} is not in binary format", 500)
-
-        image = Image.open(io.BytesIO(image_data))
-        file_extension = photo_filename.split('.')[-1].lower()
-        save_format = 'PNG' if file_extension == 'png' else 'JPEG'
-        mime_type = 'image/png' if file_extension == 'png' else 'image/jpeg'
+        size = resolve_avatar_size(request.args.get('size'))
+        save_format, mime_type = avatar_format_for(photo_filename)
 
-        if image.mode == 'RGBA' and save_format == 'JPEG':
-            image = image.convert('RGB')
+        # The slug URL keeps pointing at the user's current photo, so it is revalidated rather than immutable
+        image_meta = db.get_user_image_metadata(photo_filename)
+        if not image_meta:
+            raise AppError(f"Image {photo_filename} not found in user_imgs collection", 404)
+        etag = f"{image_meta['etag']}-{size}"
+        last_modified = image_meta['uploaded_at']
+        if is_not_modified(etag, last_modified):
+            return not_modified_response(etag, last_modified, REVALIDATE_CACHE_CONTROL)
 
-        width, height = image.size
-        target_size = 142
+        resized_image_data = db.get_user_image_variant(photo_filename, size, save_format)
+        if resized_image_data is None:
+            logger.debug(f"No {size}px variant of {photo_filename} yet, rendering it")
+            image_doc = db.get_user_image_by_filename(photo_filename)
+            if not image_doc:
+                raise AppError(f"Image {photo_filename} not found in user_imgs collection", 404)
 
-        if width < target_size or height < target_size:
-            logger.debug(
-                f"Image for user {profile_slug} is too small ({width}x{height}). Resizing to {target_size}x{target_size}.")
-            image = image.resize((target_size, target_size), Image.Resampling.LANCZOS)
-        elif width > target_size or height > target_size:
-            logger.debug(
-                f"Image for user {profile_slug} is too large ({width}x{height}). Resizing to {target_size}x{target_size}.")
-            image = image.resize((target_size, target_size), Image.Resampling.LANCZOS)
+            image_data = image_doc['data']
+            if not isinstance(image_data, bytes):
+                raise AppError(f"Image data for {photo_filename} is not in binary format", 500)
 
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format=save_format, quality=90 if save_format == 'JPEG' else None)
-        resized_image_data = img_byte_arr.getvalue()
+            resized_image_data = render_avatar_variant(image_data, size, save_format)
+            db.save_user_image_variant(photo_filename, size, save_format, resized_image_data)
 
         logger.info(f"Successfully serving image for user {profile_slug}")
-        return send_file(
+        response = send_file(
             io.BytesIO(resized_image_data),
             mimetype=mime_type,
             as_attachment=False,
-            download_name=photo_filename
+            download_name=photo_filename,
+            etag=etag,
+            last_modified=last_modified
         )
+        return apply_validators(response, etag, last_modified, REVALIDATE_CACHE_CONTROL)
     except AppError as e:
         raise e
     except Exception as e:
@@ -11,12 +11,16 @@ from models.tourModel import Tour, Location
 from models.userModel import User, Role
 from models.bookingModel import Booking
 from models.testimonialModel import Testimonial
-from models.reviewModel import Review
 from Utils.AppError import AppError
+from Utils.httpCache import cache_control_for, is_not_modified, not_modified_response
+from Utils.imageResponse import stream_image_response
+from Utils.imageRenditions import TOUR_RENDITIONS, negotiate_rendition_format, rendition_filename
 from db import db
+from Utils.userDirectory import user_directory
+from Utils.tourDetailRepository import TOUR_PAGE_REVIEWS, encode_review_cursor, tour_details
+from Utils.renderCache import Deferred
 from functools import wraps
 import random
-from io import BytesIO
 from flask_wtf import FlaskForm
 from wtforms import HiddenField
 
@@ -42,22 +46,20 @@ def name_to_slug(name):
 # Route handlers
 def home():
     try:
-        # Fetch all non-secret tours
-        tours = Tour.objects(secret_tour__ne=True)
-        print(f"Found {tours.count()} non-secret tours in home")
-
-        # Select up to 4 random tours for the Popular Destinations section
-        random_tours = list(tours)
-        if random_tours:
-            random_tours = random.sample(random_tours, min(4, len(random_tours)))
-        else:
-            random_tours = []
+        # Tours and testimonials are loaded only when their cached fragments are rendered (see Utils/renderCache.py)
+        def load_random_tours():
+            # Fetch all non-secret tours
+            tours = list(Tour.catalogue(secret_tour__ne=True))
+            print(f"Found {len(tours)} non-secret tours in home")
+
+            # Select up to 4 random tours for the Popular Destinations section
+            return random.sample(tours, min(4, len(tours))) if tours else []
 
         # Fetch guides (only active guides or lead-guides)
-        guides = list(User.objects(role__in=[Role.GUIDE.value, Role.LEAD_GUIDE.value], active=True))
+        guides = user_directory.guides()
         print(f"Found {len(guides)} active users with role 'guide' or 'lead-guide' in home")
         if not guides:
-            all_roles = User.objects().distinct('role')
+            all_roles = User.catalogue().distinct('role')
             print(f"All roles in database: {all_roles}")
 
         if guides:
@@ -76,57 +78,57 @@ def home():
             guides = []
         print(f"Guides data: {guides}")
 
-        # Fetch testimonials
-        testimonials = list(Testimonial.objects())
-        print(f"Found {len(testimonials)} testimonials in home")
-        if testimonials:
+        def load_testimonials():
+            # Fetch testimonials; authors come from the user directory instead of one query each
+            testimonials = list(Testimonial.catalogue().no_dereference())
+            print(f"Found {len(testimonials)} testimonials in home")
+            if not testimonials:
+                return []
             testimonials = random.sample(testimonials, min(5, len(testimonials)))
-            testimonials = [testimonial.populate() for testimonial in testimonials]
-            testimonials = [
+            testimonials = [(testimonial, user_directory.get(testimonial.user)) for testimonial in testimonials]
+            return [
                 {
                     '_id': str(testimonial.id),
                     'review': testimonial.review,
                     'name': testimonial.name,
                     'date': testimonial.date.strftime('%Y-%m-%d') if testimonial.date else 'Unknown Date',
                     'user': {
-                        '_id': str(testimonial.user.id) if testimonial.user else '',
-                        'name': testimonial.user.name if testimonial.user else 'Anonymous',
-                        'photo': f"/api/v1/users/image/{testimonial.user.profile_slug}" if testimonial.user and testimonial.user.photo and testimonial.user.photo != 'default.jpg' else '/static/img/users/default.jpg',
-                        'profile_slug': testimonial.user.profile_slug if testimonial.user else ''
+                        '_id': str(author.id) if author else '',
+                        'name': author.name if author else 'Anonymous',
+                        'photo': f"/api/v1/users/image/{author.profile_slug}" if author and author.photo and author.photo != 'default.jpg' else '/static/img/users/default.jpg',
+                        'profile_slug': author.profile_slug if author else ''
                     }
                 }
-                for testimonial in testimonials
+                for testimonial, author in testimonials
             ]
-        else:
-            testimonials = []
-        print(f"Testimonials data: {testimonials}")
 
-        return render_template('index.html', title='All Tours', tours=tours, random_tours=random_tours, guides=guides, testimonials=testimonials)
+        return render_template('index.html', title='All Tours', random_tours=Deferred(load_random_tours),
+                               guides=guides, testimonials=Deferred(load_testimonials))
     except Exception as e:
         print(f"Error in home: {str(e)}")
         raise AppError(str(e), 500)
 
 def get_tour(slug):
     try:
-        tour = Tour.objects(slug=slug, secret_tour__ne=True).first()
+        # Tour, guides, newest reviews with their authors and the review count in one aggregation
+        tour = tour_details.by_slug(slug, review_limit=TOUR_PAGE_REVIEWS)
         if not tour:
             flash('There is no tour with that name.', 'error')
             return render_template('error.html', title='Tour Not Found'), 404
-        # Populate guides
-        tour = tour.populate_guides()
-        # Manually fetch and populate reviews
-        reviews = Review.objects(tour=tour.id)
+        populated_reviews = tour.reviews
         tour.reviews = []
-        for review in reviews:
-            populated_review = review.populate()
+        for populated_review in populated_reviews:
             if (populated_review.user and
                 hasattr(populated_review.user, 'name') and
                 hasattr(populated_review.user, 'profile_slug') and
                 isinstance(populated_review.created_at, datetime)):
                 tour.reviews.append(populated_review)
             else:
-                logger.warning(f"Skipping review {review.id} for tour {tour.id}: missing or invalid user data (user: {populated_review.user.id if populated_review.user else None}, created_at: {populated_review.created_at})")
-        logger.debug(f"Loaded {len(tour.reviews)} valid reviews for tour {tour.slug}")
+                logger.warning(f"Skipping review {populated_review.id} for tour {tour.id}: missing or invalid user data (user: {populated_review.user.id if populated_review.user else None}, created_at: {populated_review.created_at})")
+        logger.debug(f"Loaded {len(tour.reviews)} of {tour.reviews_count} reviews for tour {tour.slug}")
+        # "Show more reviews" continues after the last review loaded, including any skipped above
+        next_review_cursor = (encode_review_cursor(populated_reviews[-1])
+                              if tour.reviews_count > len(populated_reviews) else None)
 
         # Validate start_dates
         if not tour.start_dates or not isinstance(tour.start_dates[0], datetime):
@@ -163,7 +165,8 @@ def get_tour(slug):
             logger.error(f"Template not found at: {template_path}")
             raise TemplateNotFound('tour_detail.html')
 
-        return render_template('tour_detail.html', title=f'{tour.name} Tour', tour=tour)
+        return render_template('tour_detail.html', title=f'{tour.name} Tour', tour=tour,
+                               next_review_cursor=next_review_cursor)
     except TemplateNotFound as e:
         logger.error(f"TemplateNotFound in get_tour: {str(e)}\n{traceback.format_exc()}")
         flash(f'Error: Template {e} not found.', 'error')
@@ -224,34 +227,37 @@ def destination():
 
         # Fetch selected tour if tour_slug is provided
         if tour_slug:
-            selected_tour = Tour.objects(slug=tour_slug, secret_tour__ne=True).first()
+            selected_tour = Tour.catalogue(slug=tour_slug, secret_tour__ne=True).first()
             if not selected_tour:
                 flash('Selected tour not found.', 'error')
             elif hasattr(g, 'user'):
                 # Check for an existing booking for this user and tour
                 booking = Booking.objects(user=g.user.id, tour=selected_tour.id).first()
 
-        query = Tour.objects(secret_tour__ne=True)
-        if search_term:
-            query = query.filter(
-                __raw__={
-                    '$or': [
-                        {'name': {'$regex': search_term, '$options': 'i'}},
-                        {'startLocation.description': {'$regex': search_term, '$options': 'i'}}
-                    ]
-                }
-            )
-        tours = list(query.order_by('-ratings_average'))
-        print(f"Found {len(tours)} non-secret tours")
-        for tour in tours:
-            print(f"Tour: {tour.name}, ImageCover: {tour.image_cover}, Secret: {tour.secret_tour}")
-        if len(tours) == 0:
-            print("Warning: No tours available for destination page.")
+        # Loaded only when the cached tour cards are rendered
+        def load_tours():
+            query = Tour.catalogue(secret_tour__ne=True)
+            if search_term:
+                query = query.filter(
+                    __raw__={
+                        '$or': [
+                            {'name': {'$regex': search_term, '$options': 'i'}},
+                            {'startLocation.description': {'$regex': search_term, '$options': 'i'}}
+                        ]
+                    }
+                )
+            tours = list(query.order_by('-ratings_average'))
+            print(f"Found {len(tours)} non-secret tours")
+            for tour in tours:
+                print(f"Tour: {tour.name}, ImageCover: {tour.image_cover}, Secret: {tour.secret_tour}")
+            if len(tours) == 0:
+                print("Warning: No tours available for destination page.")
+            return tours
 
         return render_template(
             'destination.html',
             title='Destinations',
-            tours=tours,
+            tours=Deferred(load_tours),
             search_term=search_term,
             selected_tour=selected_tour,
             booking=booking
@@ -263,17 +269,37 @@ def destination():
 
 def serve_image(filename):
     try:
-        image_doc = db.get_image_by_filename(filename)
-        if not image_doc:
+        image_meta = None
+        size = request.args.get('size')
+        if size in TOUR_RENDITIONS:
+            # ?size= picks a pre-rendered rendition; ?format= or the Accept header picks WebP or JPEG
+            image_format = negotiate_rendition_format(request.args.get('format'), request.accept_mimetypes)
+            image_meta = db.get_image_metadata(rendition_filename(filename, size, image_format))
+            if image_meta:
+                filename = image_meta['filename']
+        if not image_meta:
+            image_meta = db.get_image_metadata(filename)
+        if not image_meta:
             placeholder_path = os.path.join("static", "img", "placeholder.jpg")
             return send_file(placeholder_path, mimetype='image/jpeg')
-        image_data = image_doc["data"]
-        return send_file(
-            BytesIO(image_data),
-            mimetype='image/jpeg',
-            as_attachment=False,
-            download_name=filename
-        )
+
+        etag, last_modified = image_meta['etag'], image_meta['uploaded_at']
+        cache_control = cache_control_for(filename)
+        if is_not_modified(etag, last_modified):
+            response = not_modified_response(etag, last_modified, cache_control)
+        else:
+            image = db.open_image(filename)
+            if not image:
+                placeholder_path = os.path.join("static", "img", "placeholder.jpg")
+                return send_file(placeholder_path, mimetype='image/jpeg')
+            response = stream_image_response(
+                image['stream'], image['length'], image_meta['content_type'], filename, etag, last_modified,
+                cache_control
+            )
+        if size in TOUR_RENDITIONS and 'format' not in request.args:
+            # The body depends on whether the client advertised WebP support
+            response.vary.add('Accept')
+        return response
     except Exception as e:
         print(f"Error serving image {filename}: {e}")
         placeholder_path = os.path.join("static", "img", "placeholder.jpg")
@@ -282,11 +308,11 @@ def serve_image(filename):
 def about():
     try:
         logger.debug("Entering about() function")
-        guides = User.objects(role__in=[Role.GUIDE, Role.LEAD_GUIDE], active=True).order_by('-role', 'name')
+        guides = user_directory.guides()
         logger.debug(f"Found {len(guides)} active users with role 'guide' or 'lead-guide': {[g.name for g in guides]}")
 
         if not guides:
-            all_roles = User.objects().distinct('role')
+            all_roles = User.catalogue().distinct('role')
             logger.debug(f"No guides found. All roles in database: {all_roles}")
             flash('No guides available at the moment.', 'info')
             selected_guides = []
@@ -349,11 +375,11 @@ def error():
 def team():
     try:
         logger.debug("Entering team() function")
-        guides = User.objects(role__in=[Role.GUIDE, Role.LEAD_GUIDE], active=True).order_by('-role', 'name')
+        guides = user_directory.guides()
         logger.debug(f"Found {len(guides)} active users with role 'guide' or 'lead-guide': {[g.name for g in guides]}")
 
         if not guides:
-            all_roles = User.objects().distinct('role')
+            all_roles = User.catalogue().distinct('role')
             logger.debug(f"No guides found. All roles in database: {all_roles}")
             flash('No guides available at the moment.', 'info')
             selected_guides = []
@@ -394,26 +420,27 @@ def team():
 
 def testimonial():
     try:
-        testimonials_raw = Testimonial.objects()
-        testimonials = []
-        for testimonial in testimonials_raw:
-            testimonial = testimonial.populate()
-            testimonials.append({
-                'name': testimonial.name if testimonial.name else 'Anonymous',
-                'review': testimonial.review if testimonial.review else 'No review provided',
-                'date': testimonial.date.strftime('%Y-%m-%d') if testimonial.date else 'Unknown Date',
-                'user': {
-                    '_id': str(testimonial.user.id),  # Keep for reference if needed
-                    'photo': f"/api/v1/users/image/{testimonial.user.profile_slug}" if testimonial.user and testimonial.user.photo else '/static/img/users/default.jpg'
-                } if testimonial.user else {
-                    '_id': str(testimonial.id),
-                    'photo': 'default.jpg'
-                }
-            })
-        print(f"Found {len(testimonials)} testimonials")
-        for t in testimonials:
-            print(t)
-        return render_template('testimonial.html', title='Testimonials', testimonials=testimonials)
+        # Loaded only when the cached carousel is rendered
+        def load_testimonials():
+            testimonials = []
+            for testimonial in Testimonial.catalogue().no_dereference():
+                author = user_directory.get(testimonial.user)
+                testimonials.append({
+                    'name': testimonial.name if testimonial.name else 'Anonymous',
+                    'review': testimonial.review if testimonial.review else 'No review provided',
+                    'date': testimonial.date.strftime('%Y-%m-%d') if testimonial.date else 'Unknown Date',
+                    'user': {
+                        '_id': str(author.id),  # Keep for reference if needed
+                        'photo': f"/api/v1/users/image/{author.profile_slug}" if author.photo else '/static/img/users/default.jpg'
+                    } if author else {
+                        '_id': str(testimonial.id),
+                        'photo': 'default.jpg'
+                    }
+                })
+            print(f"Found {len(testimonials)} testimonials")
+            return testimonials
+
+        return render_template('testimonial.html', title='Testimonials', testimonials=Deferred(load_testimonials))
     except Exception as e:
         print(f"Error in testimonial: {str(e)}")
         flash(f'Error rendering testimonial page: {e}', 'error')
@@ -422,25 +449,26 @@ def testimonial():
 def guide_profile(name):
     try:
         logger.debug(f"Entering guide_profile with name: {name}")
-        guide = User.objects(name=name, role__in=[Role.GUIDE, Role.LEAD_GUIDE], active=True).first()
+        guide = User.catalogue(name=name, role__in=[Role.GUIDE, Role.LEAD_GUIDE], active=True).first()
         if not guide:
             logger.error(f"No active guide or lead-guide found with name: {name}")
             flash('Guide not found.', 'error')
             return render_template('error.html', title='Guide Not Found'), 404
         logger.debug(f"Found guide: {guide.name}, profile_slug: {guide.profile_slug}")
 
-        tours = Tour.objects(guides__in=[guide.id]).order_by('name')
-        tour_data = []
-        for tour in tours:
-            logger.debug(f"Tour {tour.name}: image_cover={tour.image_cover}, slug={tour.slug}")
-            tour_data.append({
-                'name': tour.name,
-                'image_cover': tour.image_cover if tour.image_cover else 'default.jpg',
-                'slug': tour.slug  # Added for linking to tour detail page
-            })
-        logger.debug(f"Found {len(tour_data)} tours for guide {guide.name}: {[t['name'] for t in tour_data]}")
-        logger.debug(f"Tour image_cover values: {[t['image_cover'] for t in tour_data]}")
-        logger.debug(f"Tour slugs: {[t['slug'] for t in tour_data]}")
+        # Loaded only when the cached tour cards are rendered
+        def load_tour_data():
+            tours = Tour.catalogue(guides__in=[guide.id]).order_by('name')
+            tour_data = []
+            for tour in tours:
+                logger.debug(f"Tour {tour.name}: image_cover={tour.image_cover}, slug={tour.slug}")
+                tour_data.append({
+                    'name': tour.name,
+                    'image_cover': tour.image_cover if tour.image_cover else 'default.jpg',
+                    'slug': tour.slug  # Added for linking to tour detail page
+                })
+            logger.debug(f"Found {len(tour_data)} tours for guide {guide.name}: {[t['name'] for t in tour_data]}")
+            return tour_data
 
         guide_data = {
             'name': guide.name,
@@ -456,7 +484,7 @@ def guide_profile(name):
         logger.debug(f"Prepared guide_data: {guide_data}")
 
         logger.debug("Attempting to render guide_profile.html")
-        response = render_template('guide_profile.html', title=f"{guide.name}'s Profile", guide=guide_data, tours=tour_data)
+        response = render_template('guide_profile.html', title=f"{guide.name}'s Profile", guide=guide_data, tours=Deferred(load_tour_data))
         logger.debug("Successfully rendered guide_profile.html")
         return response
     except TemplateNotFound as e:
@@ -1,117 +1,631 @@
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, ConfigurationError
+from pymongo import ReturnDocument, UpdateOne
+from gridfs import GridFSBucket
+from pymongo.errors import BulkWriteError, ConnectionFailure, ConfigurationError, OperationFailure
 from dotenv import load_dotenv
+import io
+import logging
 import os
-from mongoengine import connect
+import threading
+import time
+from datetime import datetime
+from mongoengine import disconnect, register_connection
+from mongoengine.connection import get_connection
 from bson.binary import Binary
+from PIL import Image
+from Utils.cache import LRUCache
+from Utils.httpCache import compute_etag
+from Utils.invalidationBus import invalidation_bus
+from Utils.mongoPool import PoolMetrics, QueryCounter, mongo_client_options
 
 # Load environment variables
 load_dotenv()
 
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+# DEBUG traces every collection access; identical debug messages are let through at most once per interval
+logger.setLevel(os.getenv('DB_LOG_LEVEL', 'INFO').upper())
+DB_DEBUG_LOG_INTERVAL = float(os.getenv('DB_DEBUG_LOG_INTERVAL', 1.0))
+
+
+class RateLimitedDebugFilter(logging.Filter):
+    """Drop repeats of a debug message within `interval` seconds and report how many were dropped."""
+
+    MAX_TRACKED_MESSAGES = 1024
+
+    def __init__(self, interval):
+        super().__init__()
+        self.interval = interval
+        self._last_emitted = {}
+        self._suppressed = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.interval <= 0:
+            return True
+        key = (record.msg, str(record.args))
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_emitted.get(key)
+            if last is not None and now - last < self.interval:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return False
+            if len(self._last_emitted) >= self.MAX_TRACKED_MESSAGES:
+                self._last_emitted.clear()
+                self._suppressed.clear()
+            self._last_emitted[key] = now
+            suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            record.msg = f"{record.msg} (repeated {suppressed} more times)"
+        return True
+
+
+logger.addFilter(RateLimitedDebugFilter(DB_DEBUG_LOG_INTERVAL))
+
+# Number of rendered avatar variants kept in process memory
+USER_IMG_VARIANT_CACHE_SIZE = int(os.getenv('USER_IMG_VARIANT_CACHE_SIZE', 512))
+
+# In-process blob cache fronting the imgs and user_imgs collections
+IMAGE_CACHE_MB = float(os.getenv('IMAGE_CACHE_MB', 64))
+IMAGE_CACHE_TTL = float(os.getenv('IMAGE_CACHE_TTL', 600))
+# GridFS blobs above this size are streamed to the client instead of being cached whole
+IMAGE_CACHE_MAX_ENTRY_BYTES = int(float(os.getenv('IMAGE_CACHE_MAX_ENTRY_MB', 8)) * 1024 * 1024)
+
+# Where new image bytes are written: 'gridfs' (chunked, no size limit) or 'inline' (single `data` field).
+# Reads understand both layouts, so existing inline documents keep working after switching.
+IMAGE_STORAGE_BACKEND = os.getenv('IMAGE_STORAGE_BACKEND', 'gridfs').lower()
+
+# Metadata lookups (existence, size, content type, validators) kept in process memory
+IMAGE_META_CACHE_SIZE = int(os.getenv('IMAGE_META_CACHE_SIZE', 2048))
+
+# Number of images sent per bulk_write by save_images_bulk
+IMAGE_BULK_BATCH_SIZE = int(os.getenv('IMAGE_BULK_BATCH_SIZE', 50))
+
+
+def _image_doc_size(image_doc):
+    return len(image_doc.get('data') or b'')
+
+def _guess_content_type(filename):
+    return 'image/png' if filename.lower().endswith('.png') else 'image/jpeg'
+
+def _probe_image(filename, image_data):
+    """Read content type and dimensions from the image header without decoding the pixels."""
+    try:
+        with Image.open(io.BytesIO(bytes(image_data))) as image:
+            return Image.MIME.get(image.format, _guess_content_type(filename)), image.width, image.height
+    except Exception:
+        return _guess_content_type(filename), None, None
+
 class Database:
+    # Handles that only exist once connect() has run; the first access to any of them connects
+    LAZY_ATTRIBUTES = (
+        'client', 'db', 'users_collection', 'tours_collection', 'reviews_collection', 'user_imgs_collection',
+        'imgs_collection', 'user_img_variants_collection', 'img_meta_collection'
+    )
+
     def __init__(self):
         self.connection_string = os.getenv('MONGODB_URI')
-        self.client = None
-        self.db = None
-        self.users_collection = None
-        self.tours_collection = None
-        self.reviews_collection = None
-        self.user_imgs_collection = None
-        self.imgs_collection = None
+        self.image_buckets = {}
+        self.user_img_variant_cache = LRUCache(max_items=USER_IMG_VARIANT_CACHE_SIZE)
+        self.image_cache = LRUCache(
+            max_items=None,
+            max_bytes=int(IMAGE_CACHE_MB * 1024 * 1024),
+            ttl=IMAGE_CACHE_TTL,
+            sizeof=_image_doc_size
+        )
+        self.image_meta_cache = LRUCache(max_items=IMAGE_META_CACHE_SIZE, ttl=IMAGE_CACHE_TTL)
         # self.tour_imgs_collection = None  # Commented out: No longer using tour_imgs
-        self.all_users = []
-        self.connect()
+        self.pool_metrics = PoolMetrics()
+        self.query_counter = QueryCounter()
+        self._connect_lock = threading.Lock()
+        self.register()
+        # Image writes from this and other processes drop the cached blob and metadata
+        invalidation_bus.subscribe('imgs', self._on_image_changed)
+        invalidation_bus.subscribe('user_imgs', self._on_image_changed)
+        # A forked child (e.g. a gunicorn worker) must not share the parent's sockets: give it its own pool
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def __getattr__(self, name):
+        # Only called for attributes that are not set yet, i.e. before the first connect()
+        if name not in Database.LAZY_ATTRIBUTES:
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        with self._connect_lock:
+            if name not in self.__dict__:
+                self.connect()
+        return self.__dict__[name]
+
+    def is_connected(self):
+        """Whether connect() has run in this process, checked without triggering it."""
+        return 'client' in self.__dict__
+
+    def _on_image_changed(self, event):
+        filename = event.fields.get('filename')
+        if filename is None:
+            # A delete seen through a change stream only carries the _id
+            self.image_cache.clear()
+            self.image_meta_cache.clear()
+            return
+        self.image_cache.pop((event.collection, filename))
+        self.image_meta_cache.pop((event.collection, filename))
+
+    def register(self):
+        """Record the connection settings for mongoengine. No I/O happens until a query needs the client."""
+        register_connection('default', db='tourist_db', host=self.connection_string,
+                            event_listeners=[self.pool_metrics, self.query_counter], **mongo_client_options())
+
+    def _reset_after_fork(self):
+        # Drop the parent's client (if it ever connected); the child connects on its first query
+        disconnect()
+        for name in Database.LAZY_ATTRIBUTES:
+            self.__dict__.pop(name, None)
+        self.image_buckets = {}
+        self.pool_metrics.reset()
+        self.query_counter.reset()
+        self._connect_lock = threading.Lock()
+        self.register()
 
     def connect(self):
         try:
-            print(f"Connecting to MongoDB")
-            self.client = MongoClient(self.connection_string, serverSelectionTimeoutMS=5000)
-            self.client.admin.command('ping')
+            logger.info("Connecting to MongoDB")
+            # One pooled client for everything: mongoengine owns it and the raw collections reuse it
+            client = get_connection()
+            client.admin.command('ping')
+            self.client = client
             self.db = self.client['tourist_db']
             self.users_collection = self.db['users']
             self.tours_collection = self.db['tours']
             self.reviews_collection = self.db['reviews']
             self.user_imgs_collection = self.db['user_imgs']
             self.imgs_collection = self.db['imgs']
+            self.user_img_variants_collection = self.db['user_img_variants']
+            self.img_meta_collection = self.db['img_meta']
+            self.image_buckets = {}
+            self.ensure_indexes()
             # self.tour_imgs_collection = self.db['tour_imgs']  # Commented out: No longer using tour_imgs
-            print(f"Initialized collections")
-            print("DB connection successful!")
-
-            connect(db='tourist_db', host=self.connection_string)
-            print("MongoEngine connection successful!")
+            logger.info("Initialized collections")
+            logger.info("DB connection successful!")
+            logger.info("MongoEngine connection successful!")
         except ConnectionFailure as e:
-            print(f"Failed to connect to MongoDB: {e}")
+            logger.error(f"Failed to connect to MongoDB: {e}")
             raise
         except ConfigurationError as e:
-            print(f"DNS resolution error: {e}. Please check your connection string and network settings.")
+            logger.error(f"DNS resolution error: {e}. Please check your connection string and network settings.")
             raise
 
+    def ensure_indexes(self):
+        """Provision the indexes the raw pymongo image collections rely on. Safe to call on every startup."""
+        for collection in (self.imgs_collection, self.user_imgs_collection):
+            try:
+                collection.create_index([("filename", 1)], unique=True, name="filename_unique")
+            except OperationFailure as e:
+                # Duplicate filenames written before the index existed; lookups still work, writes upsert
+                logger.warning(f"Could not create unique filename index on {collection.name}: {e}")
+            # Covering index so conditional requests are answered without touching the blob
+            collection.create_index([("filename", 1), ("etag", 1), ("uploaded_at", 1)])
+        self.imgs_collection.create_index([("metadata.type", 1)], sparse=True)
+        self.user_img_variants_collection.create_index(
+            [("filename", 1), ("size", 1), ("format", 1)], unique=True
+        )
+        self.img_meta_collection.create_index([("collection", 1), ("filename", 1)], unique=True)
+        logger.info("Ensured image collection indexes")
+
     def get_imgs_collection(self):
-        print("Getting imgs collection...")
+        logger.debug("Getting %s collection", "imgs")
         if self.imgs_collection is None:
-            print("Imgs collection is None, connecting...")
+            logger.warning("Imgs collection is None, connecting...")
             self.connect()
-        print(f"Returning imgs collection: {self.imgs_collection}")
         return self.imgs_collection
 
     def save_image_to_imgs(self, filename, image_data, metadata=None):
         """Save an image to the imgs collection with optional metadata."""
         try:
             collection = self.get_imgs_collection()
-            print(f"Collection accessible: {collection is not None}")
             if collection is None:
-                print("Imgs collection is None! Cannot save image.")
+                logger.warning("Imgs collection is None! Cannot save image.")
                 return False
 
-            # Check if the image already exists
-            existing = collection.find_one({"filename": filename})
-            print(f"Checking for existing image {filename}: {existing is not None}")
+            if self._replace_image(collection, filename, image_data, {"metadata": metadata or {}}):
+                logger.info(f"Updated image {filename} in imgs collection.")
+            else:
+                logger.info(f"Saved image {filename} to imgs collection.")
+            return True
+        except Exception as e:
+            logger.error(f"Error saving image {filename}: {e}")
+            return False
+
+    def _replace_image(self, collection, filename, image_data, extra_fields=None):
+        """Insert or overwrite an image in a single atomic upsert. Returns True if an older version was replaced."""
+        blob_fields, stale_fields = self._store_image_blob(collection, filename, image_data)
+        image_doc = {
+            "filename": filename,
+            "etag": compute_etag(image_data),
+            "uploaded_at": datetime.utcnow(),
+            **(extra_fields or {}),
+            **blob_fields
+        }
+        # The previous version is returned only to clean up its GridFS file
+        previous = collection.find_one_and_update(
+            {"filename": filename},
+            {"$set": image_doc, "$unset": stale_fields},
+            projection={"gridfs_id": 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+        if previous:
+            self._delete_image_blob(collection, previous)
+        self._save_image_meta(collection, image_doc, image_data)
+        invalidation_bus.notify(collection.name, filename=filename)
+        return previous is not None
+
+    def get_image_collection(self, collection_name):
+        """Resolve 'imgs' or 'user_imgs' to its collection."""
+        return {
+            'imgs': self.get_imgs_collection,
+            'user_imgs': self.get_user_imgs_collection
+        }[collection_name]()
+
+    def save_images_bulk(self, collection_name, images):
+        """
+        Upsert many images into `imgs` or `user_imgs` with batched bulk_write calls.
+
+        Args:
+            collection_name (str): 'imgs' or 'user_imgs'.
+            images (iterable): (filename, image_data, metadata) tuples; metadata may be None.
+
+        Returns:
+            dict: Counts of inserted, updated and failed images.
+        """
+        collection = self.get_image_collection(collection_name)
+        totals = {"inserted": 0, "updated": 0, "failed": 0}
+        batch = []
+
+        def flush():
+            filenames = [filename for filename, _, _, _ in batch]
+            # Previous GridFS files of the images being replaced, fetched in one query per batch
+            previous = list(collection.find({"filename": {"$in": filenames}}, {"filename": 1, "gridfs_id": 1}))
+            failed = set()
+            try:
+                result = collection.bulk_write([operation for _, operation, _, _ in batch], ordered=False)
+                totals["inserted"] += result.upserted_count
+                totals["updated"] += result.matched_count
+            except BulkWriteError as e:
+                failed = {error["index"] for error in e.details.get("writeErrors", [])}
+                totals["inserted"] += e.details.get("nUpserted", 0)
+                totals["updated"] += e.details.get("nMatched", 0)
+                logger.error(f"Error bulk saving {len(failed)} of {len(batch)} images to {collection_name}: {e}")
+            except Exception as e:
+                failed = set(range(len(batch)))
+                logger.error(f"Error bulk saving {len(batch)} images to {collection_name}: {e}")
+            totals["failed"] += len(failed)
+            # Blobs of failed writes are orphaned, blobs of successfully replaced images are stale
+            failed_filenames = {batch[index][0] for index in failed}
+            stale = [batch[index][2] for index in failed]
+            stale += [image_doc for image_doc in previous if image_doc["filename"] not in failed_filenames]
+            for image_doc in stale:
+                self._delete_image_blob(collection, image_doc)
+            meta_operations = [batch[index][3] for index in range(len(batch)) if index not in failed]
+            if meta_operations:
+                # The images are stored either way: log and carry on like _save_image_meta, so the bus still hears of them
+                try:
+                    self.get_img_meta_collection().bulk_write(meta_operations, ordered=False)
+                except Exception as e:
+                    logger.error(f"Error saving metadata for {len(meta_operations)} images in {collection_name}: {e}")
+            for filename in filenames:
+                invalidation_bus.notify(collection.name, filename=filename)
+            batch.clear()
+
+        for filename, image_data, metadata in images:
+            try:
+                blob_fields, stale_fields = self._store_image_blob(collection, filename, image_data)
+            except Exception as e:
+                logger.error(f"Error storing image {filename}: {e}")
+                totals["failed"] += 1
+                continue
             image_doc = {
                 "filename": filename,
-                "data": image_data,
-                "metadata": metadata or {}
+                "metadata": metadata or {},
+                "etag": compute_etag(image_data),
+                "uploaded_at": datetime.utcnow(),
+                **blob_fields
             }
-            if existing:
-                # Update existing image
-                collection.update_one(
-                    {"filename": filename},
-                    {"$set": image_doc}
-                )
-                print(f"Updated image {filename} in imgs collection.")
-            else:
-                # Insert new image
-                collection.insert_one(image_doc)
-                print(f"Saved image {filename} to imgs collection.")
+            batch.append((filename, UpdateOne(
+                {"filename": filename},
+                {"$set": image_doc, "$unset": stale_fields},
+                upsert=True
+            ), blob_fields, self._image_meta_operation(collection, image_doc, image_data)))
+            if len(batch) >= IMAGE_BULK_BATCH_SIZE:
+                flush()
+        if batch:
+            flush()
+        logger.info(f"Bulk saved images to {collection_name}: {totals}")
+        return totals
+
+    def delete_images(self, collection_name, filenames):
+        """Remove images from `imgs` or `user_imgs` together with their GridFS files and img_meta entries."""
+        filenames = list(filenames)
+        try:
+            collection = self.get_image_collection(collection_name)
+            image_docs = list(collection.find({"filename": {"$in": filenames}}, {"filename": 1, "gridfs_id": 1}))
+            collection.delete_many({"filename": {"$in": filenames}})
+            self.get_img_meta_collection().delete_many({"collection": collection.name, "filename": {"$in": filenames}})
+            for image_doc in image_docs:
+                self._delete_image_blob(collection, image_doc)
+            for filename in filenames:
+                invalidation_bus.notify(collection.name, filename=filename)
             return True
         except Exception as e:
-            print(f"Error saving image {filename}: {e}")
+            logger.error(f"Error deleting images {filenames} from {collection_name}: {e}")
             return False
 
+    def get_img_meta_collection(self):
+        if self.img_meta_collection is None:
+            self.connect()
+        return self.img_meta_collection
+
+    def _image_meta_operation(self, collection, image_doc, image_data):
+        """Build the sidecar img_meta upsert describing a freshly written image."""
+        content_type, width, height = _probe_image(image_doc["filename"], image_data)
+        key = {"collection": collection.name, "filename": image_doc["filename"]}
+        return UpdateOne(key, {"$set": {
+            **key,
+            "size": len(image_data),
+            "content_type": content_type,
+            "etag": image_doc["etag"],
+            "width": width,
+            "height": height,
+            "uploaded_at": image_doc["uploaded_at"]
+        }}, upsert=True)
+
+    def _save_image_meta(self, collection, image_doc, image_data):
+        try:
+            self.get_img_meta_collection().bulk_write([self._image_meta_operation(collection, image_doc, image_data)])
+        except Exception as e:
+            logger.error(f"Error saving metadata for image {image_doc['filename']}: {e}")
+        self.image_meta_cache.pop((collection.name, image_doc["filename"]))
+
+    def _get_image_metadata(self, collection, filename):
+        """
+        Return {"filename", "size", "content_type", "etag", "width", "height", "uploaded_at"} for an image,
+        or None if it does not exist. Never reads image bytes except to backfill validators of legacy documents.
+        """
+        key = (collection.name, filename)
+        meta = self.image_meta_cache.get(key)
+        if meta is not None:
+            return meta
+
+        meta = self.get_img_meta_collection().find_one(
+            {"collection": collection.name, "filename": filename},
+            {"_id": 0, "collection": 0}
+        )
+        if meta is None:
+            # Image stored before the sidecar existed: describe it from a projected lookup and record it
+            # $binarySize measures legacy inline blobs on the server, so the bytes never leave it
+            image_doc = next(collection.aggregate([
+                {"$match": {"filename": filename}},
+                {"$limit": 1},
+                {"$project": {"_id": 0, "length": {"$ifNull": ["$length", {"$binarySize": "$data"}]}}}
+            ]), None)
+            if not image_doc:
+                return None
+            validators = self._get_image_validators(collection, filename)
+            meta = {
+                "filename": filename,
+                "size": image_doc.get("length"),
+                "content_type": _guess_content_type(filename),
+                "etag": validators["etag"],
+                "width": None,
+                "height": None,
+                "uploaded_at": validators["uploaded_at"]
+            }
+            self.get_img_meta_collection().update_one(
+                {"collection": collection.name, "filename": filename},
+                {"$setOnInsert": {"collection": collection.name, **meta}},
+                upsert=True
+            )
+        self.image_meta_cache.set(key, meta)
+        return meta
+
+    def get_image_metadata(self, filename):
+        """Retrieve size, content type, ETag, dimensions and upload time of an image in the imgs collection."""
+        try:
+            return self._get_image_metadata(self.get_imgs_collection(), filename)
+        except Exception as e:
+            logger.error(f"Error retrieving metadata for image {filename}: {e}")
+            return None
+
+    def get_user_image_metadata(self, filename):
+        """Retrieve size, content type, ETag, dimensions and upload time of an image in the user_imgs collection."""
+        try:
+            return self._get_image_metadata(self.get_user_imgs_collection(), filename)
+        except Exception as e:
+            logger.error(f"Error retrieving metadata for user image {filename}: {e}")
+            return None
+
+    def image_exists(self, filename):
+        """Check whether the imgs collection holds an image without transferring it."""
+        return self.get_image_metadata(filename) is not None
+
+    def user_image_exists(self, filename):
+        """Check whether the user_imgs collection holds an image without transferring it."""
+        return self.get_user_image_metadata(filename) is not None
+
+    def _get_bucket(self, collection):
+        """GridFS bucket (<collection>_fs.files / <collection>_fs.chunks) holding the bytes of an image collection."""
+        bucket = self.image_buckets.get(collection.name)
+        if bucket is None:
+            bucket = GridFSBucket(self.db, bucket_name=f"{collection.name}_fs")
+            self.image_buckets[collection.name] = bucket
+        return bucket
+
+    def _store_image_blob(self, collection, filename, image_data):
+        """
+        Write the image bytes with the configured backend.
+        Returns the fields to $set on the image document and the fields of the other layout to $unset.
+        """
+        if IMAGE_STORAGE_BACKEND == 'gridfs':
+            file_id = self._get_bucket(collection).upload_from_stream(
+                filename, io.BytesIO(bytes(image_data)), metadata={"collection": collection.name}
+            )
+            return {"gridfs_id": file_id, "length": len(image_data)}, {"data": ""}
+        return {"data": image_data, "length": len(image_data)}, {"gridfs_id": ""}
+
+    def _delete_image_blob(self, collection, image_doc):
+        """Remove the GridFS file of a replaced image version, if it had one."""
+        if image_doc and image_doc.get("gridfs_id") is not None:
+            try:
+                self._get_bucket(collection).delete(image_doc["gridfs_id"])
+            except Exception as e:
+                logger.error(f"Error deleting stale GridFS file for {image_doc.get('filename')}: {e}")
+
+    def _read_image(self, collection, filename, stream=False):
+        """
+        Fetch an image document through the in-process blob cache, with its bytes in `data`.
+        With `stream`, GridFS blobs too large to cache are returned as an open `stream` instead.
+        """
+        key = (collection.name, filename)
+        image_doc = self.image_cache.get(key)
+        if image_doc is not None:
+            return image_doc
+        image_doc = collection.find_one({"filename": filename})
+        if not image_doc:
+            return None
+        if image_doc.get("gridfs_id") is not None:
+            grid_out = self._get_bucket(collection).open_download_stream(image_doc["gridfs_id"])
+            if stream and grid_out.length > IMAGE_CACHE_MAX_ENTRY_BYTES:
+                return {**image_doc, "stream": grid_out, "length": grid_out.length}
+            image_doc['data'] = grid_out.read()
+        else:
+            image_doc['data'] = bytes(image_doc['data'])
+        self.image_cache.set(key, image_doc)
+        return image_doc
+
+    def _open_image(self, collection, filename):
+        """Return {"stream", "length", "etag", "uploaded_at"} for serving an image without buffering it twice."""
+        image_doc = self._read_image(collection, filename, stream=True)
+        if not image_doc:
+            return None
+        if "stream" in image_doc:
+            stream, length = image_doc["stream"], image_doc["length"]
+        else:
+            stream, length = io.BytesIO(image_doc["data"]), len(image_doc["data"])
+        return {
+            "filename": filename,
+            "stream": stream,
+            "length": length,
+            "etag": image_doc.get("etag"),
+            "uploaded_at": image_doc.get("uploaded_at")
+        }
+
+    def open_image(self, filename):
+        """Open an image from the imgs collection for streaming."""
+        try:
+            return self._open_image(self.get_imgs_collection(), filename)
+        except Exception as e:
+            logger.error(f"Error opening image {filename}: {e}")
+            return None
+
+    def open_user_image(self, filename):
+        """Open an image from the user_imgs collection for streaming."""
+        try:
+            return self._open_image(self.get_user_imgs_collection(), filename)
+        except Exception as e:
+            logger.error(f"Error opening user image {filename}: {e}")
+            return None
+
+    def supports_large_images(self):
+        """True when new images are chunked into GridFS and therefore not bound by the 16 MB BSON limit."""
+        return IMAGE_STORAGE_BACKEND == 'gridfs'
+
     def get_image_by_filename(self, filename):
         """Retrieve an image from the imgs collection by filename."""
         try:
             collection = self.get_imgs_collection()
             if collection is None:
                 raise ValueError("Imgs collection is not initialized.")
-            image_doc = collection.find_one({"filename": filename})
+            image_doc = self._read_image(collection, filename)
+            if not image_doc:
+                logger.debug(f"No image found with filename {filename}")
+                return None
+            return image_doc
+        except Exception as e:
+            logger.error(f"Error retrieving image {filename}: {e}")
+            return None
+
+    def get_user_image_by_filename(self, filename):
+        """Retrieve an image from the user_imgs collection by filename."""
+        try:
+            collection = self.get_user_imgs_collection()
+            if collection is None:
+                raise ValueError("User_imgs collection is not initialized.")
+            image_doc = self._read_image(collection, filename)
             if not image_doc:
-                print(f"No image found with filename {filename}")
+                logger.debug(f"No user image found with filename {filename}")
                 return None
             return image_doc
         except Exception as e:
-            print(f"Error retrieving image {filename}: {e}")
+            logger.error(f"Error retrieving user image {filename}: {e}")
             return None
 
+    def pool_stats(self):
+        """Connections open and in use, and how long requests waited to check one out of this process's pool."""
+        # Reported without connecting: a worker that has not served a query yet has no pool
+        options = self.client.options.pool_options if self.is_connected() else None
+        return {
+            'pid': os.getpid(),
+            'connected': self.is_connected(),
+            'max_pool_size': options.max_pool_size if options else None,
+            'min_pool_size': options.min_pool_size if options else None,
+            **self.pool_metrics.stats()
+        }
+
+    def image_cache_stats(self):
+        """Hit/miss counters and memory use of the image blob cache."""
+        return self.image_cache.stats()
+
+    def _get_image_validators(self, collection, filename):
+        """
+        Return {"etag", "uploaded_at"} for an image using an index-only lookup.
+        Documents written before validators existed are backfilled on first access.
+        """
+        # Peeked, not counted: the read that serves the image makes the counted lookup for this request
+        cached = self.image_cache.peek((collection.name, filename))
+        if cached is not None and cached.get("etag") and cached.get("uploaded_at"):
+            return {"filename": filename, "etag": cached["etag"], "uploaded_at": cached["uploaded_at"]}
+
+        validators = collection.find_one(
+            {"filename": filename},
+            {"_id": 0, "filename": 1, "etag": 1, "uploaded_at": 1}
+        )
+        if not validators:
+            return None
+        if validators.get("etag") and validators.get("uploaded_at"):
+            return validators
+
+        image_doc = self._read_image(collection, filename)
+        validators = {
+            "filename": filename,
+            "etag": compute_etag(image_doc["data"]),
+            "uploaded_at": image_doc["_id"].generation_time.replace(tzinfo=None)
+        }
+        collection.update_one(
+            {"_id": image_doc["_id"]},
+            {"$set": {"etag": validators["etag"], "uploaded_at": validators["uploaded_at"]}}
+        )
+        # Complete the cached copy instead of dropping it, so serving the image next is a hit
+        image_doc.update(etag=validators["etag"], uploaded_at=validators["uploaded_at"])
+        return validators
+
     def is_imgs_collection_empty(self):
         try:
             collection = self.get_imgs_collection()
             if collection is None:
                 raise ValueError("Imgs collection is not initialized.")
-            count = collection.count_documents({})
-            print(f"Imgs collection has {count} documents. Empty: {count == 0}")
+            count = collection.estimated_document_count()
+            logger.info(f"Imgs collection has {count} documents. Empty: {count == 0}")
             return count == 0
         except Exception as e:
-            print(f"Error checking imgs collection: {e}")
+            logger.error(f"Error checking imgs collection: {e}")
             return False
 
     # Commented out: Methods related to tour_imgs (no longer used)
@@ -183,63 +697,105 @@ class Database:
     #         print(f"Error checking tour_imgs collection: {e}")
     #         return False
 
-    def load_all_users(self):
-        try:
-            if self.users_collection is None:
-                self.connect()
-            self.all_users = list(self.users_collection.find())
-            print(f"Loaded {len(self.all_users)} users from the database.")
-        except Exception as e:
-            print(f"Error loading users: {e}")
-            self.all_users = []
-
     def get_users_collection(self):
-        print("Getting users collection...")
+        logger.debug("Getting %s collection", "users")
         if self.users_collection is None:
-            print("Users collection is None, connecting...")
+            logger.warning("Users collection is None, connecting...")
             self.connect()
-        print(f"Returning users collection: {self.users_collection}")
         return self.users_collection
 
     def get_tours_collection(self):
-        print("Getting tours collection...")
+        logger.debug("Getting %s collection", "tours")
         if self.tours_collection is None:
-            print("Tours collection is None, connecting...")
+            logger.warning("Tours collection is None, connecting...")
             self.connect()
-        print(f"Returning tours collection: {self.tours_collection}")
         return self.tours_collection
 
     def get_reviews_collection(self):
-        print("Getting reviews collection...")
+        logger.debug("Getting %s collection", "reviews")
         if self.reviews_collection is None:
-            print("Reviews collection is None, connecting...")
+            logger.warning("Reviews collection is None, connecting...")
             self.connect()
-        print(f"Returning reviews collection: {self.reviews_collection}")
         return self.reviews_collection
 
     def get_user_imgs_collection(self):
-        print("Getting user_imgs collection...")
+        logger.debug("Getting %s collection", "user_imgs")
         if self.user_imgs_collection is None:
-            print("User_imgs collection is None, connecting...")
+            logger.warning("User_imgs collection is None, connecting...")
             self.connect()
-        print(f"Returning user_imgs collection: {self.user_imgs_collection}")
         return self.user_imgs_collection
 
-    def save_image(self, filename, image_data):
+    def save_image(self, filename, image_data, overwrite=False):
         try:
             collection = self.get_user_imgs_collection()
-            if collection.find_one({"filename": filename}):
-                print(f"Image {filename} already exists in the database, skipping...")
-                return False
+            if overwrite:
+                self._replace_image(collection, filename, image_data)
+                logger.info(f"Saved image {filename} to user_imgs collection.")
+                return True
+            blob_fields, _ = self._store_image_blob(collection, filename, image_data)
             image_doc = {
                 "filename": filename,
-                "data": image_data
+                "etag": compute_etag(image_data),
+                "uploaded_at": datetime.utcnow(),
+                **blob_fields
             }
-            collection.insert_one(image_doc)
-            print(f"Saved image {filename} to user_imgs collection.")
+            # Insert-if-absent in one round trip; existing images are left untouched
+            result = collection.update_one({"filename": filename}, {"$setOnInsert": image_doc}, upsert=True)
+            if result.upserted_id is None:
+                self._delete_image_blob(collection, blob_fields)
+                logger.info(f"Image {filename} already exists in the database, skipping...")
+                return False
+            self._save_image_meta(collection, image_doc, image_data)
+            invalidation_bus.notify(collection.name, filename=filename)
+            logger.info(f"Saved image {filename} to user_imgs collection.")
+            return True
+        except Exception as e:
+            logger.error(f"Error saving image {filename}: {e}")
+            return False
+
+    def get_user_img_variants_collection(self):
+        logger.debug("Getting %s collection", "user_img_variants")
+        if self.user_img_variants_collection is None:
+            logger.warning("User_img_variants collection is None, connecting...")
+            self.connect()
+        return self.user_img_variants_collection
+
+    def get_user_image_variant(self, filename, size, image_format):
+        """Return the pre-rendered bytes for (filename, size, format), or None if not rendered yet."""
+        key = (filename, size, image_format)
+        cached = self.user_img_variant_cache.get(key)
+        if cached is not None:
+            return cached
+        try:
+            collection = self.get_user_img_variants_collection()
+            variant_doc = collection.find_one(
+                {"filename": filename, "size": size, "format": image_format},
+                {"data": 1}
+            )
+            if not variant_doc:
+                return None
+            image_data = bytes(variant_doc['data'])
+            self.user_img_variant_cache.set(key, image_data)
+            return image_data
+        except Exception as e:
+            logger.error(f"Error retrieving variant {size}px {image_format} of {filename}: {e}")
+            return None
+
+    def save_user_image_variant(self, filename, size, image_format, image_data):
+        """Store a rendered avatar variant and keep it in the in-process cache."""
+        try:
+            collection = self.get_user_img_variants_collection()
+            key = {"filename": filename, "size": size, "format": image_format}
+            collection.update_one(
+                key,
+                {"$set": {**key, "data": Binary(image_data)}},
+                upsert=True
+            )
+            self.user_img_variant_cache.set((filename, size, image_format), bytes(image_data))
+            logger.info(f"Saved {size}px {image_format} variant of {filename} to user_img_variants collection.")
             return True
         except Exception as e:
-            print(f"Error saving image {filename}: {e}")
+            logger.error(f"Error saving variant {size}px {image_format} of {filename}: {e}")
             return False
 
     def is_user_imgs_collection_empty(self):
@@ -247,28 +803,23 @@ class Database:
             collection = self.get_user_imgs_collection()
             if collection is None:
                 raise ValueError("User_imgs collection is not initialized.")
-            count = collection.count_documents({})
-            print(f"User_imgs collection has {count} documents. Empty: {count == 0}")
+            count = collection.estimated_document_count()
+            logger.info(f"User_imgs collection has {count} documents. Empty: {count == 0}")
             return count == 0
         except Exception as e:
-            print(f"Error checking user_imgs collection: {e}")
+            logger.error(f"Error checking user_imgs collection: {e}")
             return False
 
-    def get_all_users(self):
-        if not self.all_users:
-            self.load_all_users()
-        return self.all_users
-
     def is_users_collection_empty(self):
         try:
             collection = self.get_users_collection()
             if collection is None:
                 raise ValueError("Users collection is not initialized.")
-            count = collection.count_documents({})
-            print(f"Users collection has {count} documents. Empty: {count == 0}")
+            count = collection.estimated_document_count()
+            logger.info(f"Users collection has {count} documents. Empty: {count == 0}")
             return count == 0
         except Exception as e:
-            print(f"Error checking users collection: {e}")
+            logger.error(f"Error checking users collection: {e}")
             return False
 
     def is_tours_collection_empty(self):
@@ -276,11 +827,11 @@ class Database:
             collection = self.get_tours_collection()
             if collection is None:
                 raise ValueError("Tours collection is not initialized.")
-            count = collection.count_documents({})
-            print(f"Tours collection has {count} documents. Empty: {count == 0}")
+            count = collection.estimated_document_count()
+            logger.info(f"Tours collection has {count} documents. Empty: {count == 0}")
             return count == 0
         except Exception as e:
-            print(f"Error checking tours collection: {e}")
+            logger.error(f"Error checking tours collection: {e}")
             return False
 
     def is_reviews_collection_empty(self):
@@ -288,23 +839,23 @@ class Database:
             collection = self.get_reviews_collection()
             if collection is None:
                 raise ValueError("Reviews collection is not initialized.")
-            count = collection.count_documents({})
-            print(f"Reviews collection has {count} documents. Empty: {count == 0}")
+            count = collection.estimated_document_count()
+            logger.info(f"Reviews collection has {count} documents. Empty: {count == 0}")
             return count == 0
         except Exception as e:
-            print(f"Error checking reviews collection: {e}")
+            logger.error(f"Error checking reviews collection: {e}")
             return False
 
     def debug_tours(self):
         try:
             count = self.tours_collection.count_documents({})
             non_secret_count = self.tours_collection.count_documents({"secret_tour": {"$ne": True}})
-            print(f"Tours collection: {count} total, {non_secret_count} non-secret")
+            logger.info(f"Tours collection: {count} total, {non_secret_count} non-secret")
             tours = list(self.tours_collection.find())
-            print("All tours:", tours)
+            logger.debug("All tours: %s", tours)
             return count, non_secret_count, tours
         except Exception as e:
-            print(f"Error debugging tours: {e}")
+            logger.error(f"Error debugging tours: {e}")
             return 0, 0, []
 
 # Singleton instance
@@ -0,0 +1,26 @@
+"""
+Gunicorn settings: gunicorn -c gunicorn.conf.py
+
+The app is built by main.create_app() inside each worker, after the fork, so no MongoDB sockets,
+scheduler threads or image worker pools are created in the master and inherited by the workers.
+"""
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+wsgi_app = 'main:create_app()'
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+# Importing main in the master is safe (it does no I/O) but building the app there is not
+preload_app = False
+
+
+def post_worker_init(worker):
+    # Open the worker's pool (and provision indexes) before it accepts requests, not during the first one
+    from db import db
+    try:
+        db.client
+    except Exception as e:
+        logger.error(f"Worker {worker.pid} could not connect to MongoDB yet, retrying on first request: {e}")
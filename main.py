@@ -1,5 +1,6 @@
 from datetime import datetime, timedelta
-from flask import Flask, abort, send_file
+from flask import Flask, abort, jsonify, request, send_file
+from werkzeug.exceptions import HTTPException
 from flask_bootstrap import Bootstrap
 from dotenv import load_dotenv
 import io
@@ -8,21 +9,17 @@ import sys
 import signal
 from hashids import Hashids
 from models.bookingModel import Booking
+from Utils.httpCache import cache_control_for, is_not_modified, not_modified_response
+from Utils.imageResponse import stream_image_response
+from Utils.imageRenditions import image_srcset
+from Utils.imageJobs import shutdown_image_workers
+from Utils.invalidationBus import invalidation_bus
+from Utils.renderCache import render_cache
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize Flask app
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
-app.config['UPLOAD_FOLDER'] = 'public/img/users'
-app.config['STRIPE_PUBLIC_KEY'] = os.getenv('STRIPE_PUBLIC_KEY')
-app.config['STRIPE_SECRET_KEY'] = os.getenv('STRIPE_SECRET_KEY')
-
-# Initialize Bootstrap
-Bootstrap(app)
-
-# Import db after app initialization to avoid circular imports
+# Import db early to avoid circular imports; it only records connection settings and connects on first use
 from db import db
 
 # Global flag to track server state
@@ -60,17 +57,15 @@ def hashid_encode(value):
         print(f"Error encoding hashid: {e}")
         return value
 
-# Register the filter with Jinja2
-app.jinja_env.filters['datetimeformat'] = datetimeformat
-app.jinja_env.filters['hashid'] = hashid_encode
-
 
 # Graceful shutdown handler
 def shutdown_server():
     global server_running
     if server_running:
         print("Shutting down gracefully...")
-        if db.client:
+        # Let queued image renders finish and persist while the database is still reachable
+        shutdown_image_workers(wait=True)
+        if db.is_connected():
             print("Closing MongoDB connection...")
             db.client.close()
         server_running = False
@@ -83,99 +78,166 @@ def signal_handler(sig, frame):
     print(f"{signal.Signals(sig).name} received. Shutting down gracefully...")
     shutdown_server()
 
-signal.signal(signal.SIGTERM, signal_handler)
-signal.signal(signal.SIGINT, signal_handler)
-
-# Import controllers and routes after app initialization to avoid circular imports
-from controllers.authController import signup
-from controllers.bookingController import webhook_checkout
-from routes.viewRoutes import view_routes
-from routes.userRoutes import user_routes
-from routes.tourRoutes import tour_routes
-from routes.reviewRoutes import review_routes
-from routes.bookingRoutes import booking_routes
-from routes.testimonialRoutes import testimonial_routes
-from controllers.errorController import register_handlers
-from controllers.userController import serve_user_image
-
-# Register blueprints
-app.register_blueprint(view_routes)
-app.register_blueprint(user_routes)
-app.register_blueprint(tour_routes)
-app.register_blueprint(review_routes)
-app.register_blueprint(booking_routes)
-app.register_blueprint(testimonial_routes)
-
 # Cleaning fail payments
-from apscheduler.schedulers.background import BackgroundScheduler
-
 def cleanup_unpaid_bookings():
     threshold = datetime.utcnow() - timedelta(hours=24)
     Booking.objects(paid=False, created_at__lt=threshold).delete()
 
-scheduler = BackgroundScheduler()
-scheduler.add_job(cleanup_unpaid_bookings, 'interval', hours=24)
-scheduler.start()
+# Requests sending more MongoDB commands than this are reported (can be overridden via env vars)
+DB_QUERY_WARN_THRESHOLD = int(os.getenv('DB_QUERY_WARN_THRESHOLD', 20))
 
-# Register auth routes
-app.route('/signup', methods=['GET', 'POST'])(signup)
-app.route('/webhook-checkout', methods=['POST'])(webhook_checkout)
+# Per-request MongoDB command count, sent back as X-DB-Queries and summed per worker in /health
+def count_queries(response):
+    queries = db.query_counter.end()
+    response.headers['X-DB-Queries'] = str(queries)
+    if queries > DB_QUERY_WARN_THRESHOLD:
+        print(f"{request.method} {request.path} sent {queries} MongoDB commands")
+    return response
 
-register_handlers(app)
+# Per-process health surface: MongoDB pool usage and checkout waits, queries per request, cache invalidation and the render cache, for this worker
+def health():
+    return jsonify({'status': 'ok', 'db_pool': db.pool_stats(), 'db_queries': db.query_counter.stats(),
+                    'invalidation_bus': invalidation_bus.stats(), 'render_cache': render_cache.stats()})
 
 # Image serving routes
-@app.route('/images/user_imgs/<filename>')
 def serve_user_image_from_collection(filename):
     try:
-        collection = db.get_user_imgs_collection()
-        image_doc = collection.find_one({"filename": filename})
-        if not image_doc:
+        image_meta = db.get_user_image_metadata(filename)
+        if not image_meta:
+            abort(404, description=f"Image {filename} not found in user_imgs collection")
+
+        etag, last_modified = image_meta['etag'], image_meta['uploaded_at']
+        cache_control = cache_control_for(filename)
+        if is_not_modified(etag, last_modified):
+            return not_modified_response(etag, last_modified, cache_control)
+
+        image = db.open_user_image(filename)
+        if not image:
             abort(404, description=f"Image {filename} not found in user_imgs collection")
 
-        image_data = image_doc['data']
-        mime_type = 'image/jpeg' if filename.lower().endswith(('.jpg', '.jpeg')) else 'image/png'
-        return send_file(
-            io.BytesIO(image_data),
-            mimetype=mime_type,
-            as_attachment=False,
-            download_name=filename
+        return stream_image_response(
+            image['stream'], image['length'], image_meta['content_type'], filename, etag, last_modified, cache_control
         )
+    except HTTPException:
+        raise
     except Exception as e:
         abort(500, description=f"Error serving image {filename} from user_imgs: {str(e)}")
 
-@app.route('/images/imgs/<filename>')
 def serve_static_image(filename):
     try:
-        collection = db.get_imgs_collection()
-        image_doc = collection.find_one({"filename": filename})
-        if not image_doc:
+        image_meta = db.get_image_metadata(filename)
+        if not image_meta:
             placeholder_path = os.path.join("static", "img", "placeholder.jpg")
             if os.path.exists(placeholder_path):
                 return send_file(placeholder_path, mimetype='image/jpeg')
             abort(404, description=f"Image {filename} not found in imgs collection and no placeholder available")
 
-        image_data = image_doc['data']
-        mime_type = 'image/jpeg' if filename.lower().endswith(('.jpg', '.jpeg')) else 'image/png'
-        return send_file(
-            io.BytesIO(image_data),
-            mimetype=mime_type,
-            as_attachment=False,
-            download_name=filename
+        etag, last_modified = image_meta['etag'], image_meta['uploaded_at']
+        cache_control = cache_control_for(filename)
+        if is_not_modified(etag, last_modified):
+            return not_modified_response(etag, last_modified, cache_control)
+
+        image = db.open_image(filename)
+        if not image:
+            abort(404, description=f"Image {filename} not found in imgs collection")
+
+        return stream_image_response(
+            image['stream'], image['length'], image_meta['content_type'], filename, etag, last_modified, cache_control
         )
+    except HTTPException:
+        raise
     except Exception as e:
         abort(500, description=f"Error serving image {filename} from imgs: {str(e)}")
 
-@app.route('/images/users/<user_id>')
-def serve_user_image_route(user_id):
-    return serve_user_image(user_id)
+
+def create_app():
+    """
+    Build the Flask app: config, blueprints, error handlers, signal handlers and the booking cleanup job.
+
+    Nothing here talks to MongoDB; the first request (or gunicorn's post_worker_init hook) connects.
+    Run it in the serving process, after any fork: `gunicorn -c gunicorn.conf.py` calls it once per worker.
+    """
+    # Import controllers and routes here so importing main stays cheap and free of side effects
+    from controllers.authController import get_jwt_secret, signup
+    from controllers.bookingController import webhook_checkout
+    from routes.viewRoutes import view_routes
+    from routes.userRoutes import user_routes
+    from routes.tourRoutes import tour_routes
+    from routes.reviewRoutes import review_routes
+    from routes.bookingRoutes import booking_routes
+    from routes.testimonialRoutes import testimonial_routes
+    from controllers.errorController import register_handlers
+    from controllers.userController import serve_user_image
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    # Fail at startup rather than on the first login
+    get_jwt_secret()
+
+    # Initialize Flask app
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+    app.config['UPLOAD_FOLDER'] = 'public/img/users'
+    app.config['STRIPE_PUBLIC_KEY'] = os.getenv('STRIPE_PUBLIC_KEY')
+    app.config['STRIPE_SECRET_KEY'] = os.getenv('STRIPE_SECRET_KEY')
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    # Initialize Bootstrap
+    Bootstrap(app)
+
+    # Register the filter with Jinja2
+    app.jinja_env.filters['datetimeformat'] = datetimeformat
+    app.jinja_env.filters['hashid'] = hashid_encode
+    app.jinja_env.filters['srcset'] = image_srcset
+    app.jinja_env.globals['cached_fragment'] = render_cache.fragment
+
+    signal.signal(signal.SIGTERM, signal_handler)
+    signal.signal(signal.SIGINT, signal_handler)
+
+    # Register blueprints
+    app.register_blueprint(view_routes)
+    app.register_blueprint(user_routes)
+    app.register_blueprint(tour_routes)
+    app.register_blueprint(review_routes)
+    app.register_blueprint(booking_routes)
+    app.register_blueprint(testimonial_routes)
+
+    # Started per process: scheduler threads do not survive a fork
+    scheduler = BackgroundScheduler()
+    scheduler.add_job(cleanup_unpaid_bookings, 'interval', hours=24)
+    scheduler.start()
+
+    # Listen for other processes' writes so in-process caches stay current
+    invalidation_bus.start()
+
+    # Register auth routes
+    app.route('/signup', methods=['GET', 'POST'])(signup)
+    app.route('/webhook-checkout', methods=['POST'])(webhook_checkout)
+
+    register_handlers(app)
+    app.before_request(db.query_counter.begin)
+    app.after_request(count_queries)
+
+    app.route('/health')(health)
+    app.route('/images/user_imgs/<filename>')(serve_user_image_from_collection)
+    app.route('/images/imgs/<filename>')(serve_static_image)
+    app.route('/images/users/<profile_slug>', endpoint='serve_user_image_route')(serve_user_image)
+    return app
+
+
+def __getattr__(name):
+    # `main.app` (gunicorn main:app, `from main import app`) builds the app on first access
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # Server startup
 if __name__ == "__main__":
     print("Starting application...")
+    app = create_app()
     try:
-        if db.client is None:
-            print("Database client is None, connecting...")
-            db.connect()
         print("Pinging MongoDB server...")
         db.client.admin.command('ping')
         print("Confirmed database connection before importing data.")
@@ -1,9 +1,14 @@
 from mongoengine import Document, StringField, FloatField, DateTimeField, \
-    ReferenceField, signals
+    ReferenceField, signals, queryset_manager
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from models.tourModel import Tour
-from models.userModel import User
+from models.userModel import User, fetch_users_by_id
+from Utils.mongoPool import CATALOGUE_READ_PREFERENCE
+
+
+# User fields loaded for review authors on tour pages
+REVIEW_AUTHOR_FIELDS = ('name', 'photo', 'profile_slug')
 
 
 class Review(Document):
@@ -38,11 +43,17 @@ class Review(Document):
     meta = {
         'collection': 'reviews',  # Name of the MongoDB collection
         'indexes': [
-            {'fields': ['tour', 'user'], 'unique': True}  # Unique index on tour and user
+            {'fields': ['tour', 'user'], 'unique': True},  # Unique index on tour and user
+            {'fields': ['tour', '-created_at', '-id']}  # Newest-first review pages and counts per tour
         ],
         'auto_create_index': True
     }
 
+    @queryset_manager
+    def catalogue(doc_cls, queryset):
+        """Public review reads that may be served by a secondary (see Utils/mongoPool.CATALOGUE_READ_PREFERENCE)."""
+        return queryset.read_preference(CATALOGUE_READ_PREFERENCE)
+
     # Pre-find hook (equivalent to Mongoose pre(/^find/))
     @classmethod
     def pre_find(cls, query):
@@ -62,6 +73,20 @@ class Review(Document):
         # Note: We don't populate tour as per the commented-out Mongoose code
         return self
 
+    @staticmethod
+    def populate_many(reviews) -> List['Review']:
+        """
+        Populate the authors of many reviews with one User query instead of one per review.
+        Authors that no longer exist are left as None.
+        """
+        reviews = list(reviews)
+        # Raw references: reading review.user would dereference each author separately
+        authors = fetch_users_by_id([review._data.get('user') for review in reviews], *REVIEW_AUTHOR_FIELDS)
+        for review in reviews:
+            reference = review._data.get('user')
+            review.user = authors.get(getattr(reference, 'id', reference))
+        return reviews
+
     # Static method to calculate average ratings
     @staticmethod
     def calc_average_ratings(tour_id: str) -> None:
@@ -136,7 +161,7 @@ signals.post_save.connect(Review.post_save, sender=Review)
 # Helper to apply population
 def get_reviews():
     reviews = Review.objects(__raw__={})
-    return [review.populate() for review in reviews]
+    return Review.populate_many(reviews)
 
 
 if __name__ == "__main__":
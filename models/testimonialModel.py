@@ -1,6 +1,7 @@
-from mongoengine import Document, StringField, DateTimeField, ReferenceField, signals
+from mongoengine import Document, StringField, DateTimeField, ReferenceField, signals, queryset_manager
 from datetime import datetime
 from models.userModel import User
+from Utils.mongoPool import CATALOGUE_READ_PREFERENCE
 
 
 class Testimonial(Document):
@@ -36,6 +37,11 @@ class Testimonial(Document):
         'auto_create_index': True
     }
 
+    @queryset_manager
+    def catalogue(doc_cls, queryset):
+        """Testimonial reads that may be served by a secondary (see Utils/mongoPool.CATALOGUE_READ_PREFERENCE)."""
+        return queryset.read_preference(CATALOGUE_READ_PREFERENCE)
+
     # Pre-find hook to modify query
     @classmethod
     def pre_find(cls, query):
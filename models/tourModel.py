@@ -1,12 +1,17 @@
 from mongoengine import Document, StringField, IntField, FloatField, ListField, \
     ReferenceField, DateTimeField, BooleanField, EmbeddedDocument, \
     EmbeddedDocumentField, ValidationError, QuerySet, ObjectIdField
-from mongoengine import signals
+from mongoengine import signals, queryset_manager
+from Utils.mongoPool import CATALOGUE_READ_PREFERENCE
+from models.userModel import fetch_users_by_id
 from slugify import slugify
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
 from dateutil import parser
 
+# User fields loaded by Tour.populate_guides
+GUIDE_FIELDS = ('name', 'photo', 'role', 'profile_slug')
+
 class Location(EmbeddedDocument):
     _id = ObjectIdField(required=False)
     type = StringField(default="Point", choices=["Point"], required=True)
@@ -94,6 +99,9 @@ class Tour(Document):
     locations = ListField(EmbeddedDocumentField(Location), db_field='locations')
     guides = ListField(ReferenceField('User'), db_field='guides')
     stripe_payment_link = StringField(db_field='paymentLink')
+    # Progress of the background rendering of uploaded images; images_job ties it to the latest upload
+    images_status = StringField(default='ready', choices=['processing', 'ready', 'failed'], db_field='imagesStatus')
+    images_job = StringField(db_field='imagesJob')
 
     meta = {
         'collection': 'tours',
@@ -105,6 +113,11 @@ class Tour(Document):
         ]
     }
 
+    @queryset_manager
+    def catalogue(doc_cls, queryset):
+        """Tour listing and detail reads that may be served by a secondary (see Utils/mongoPool.CATALOGUE_READ_PREFERENCE)."""
+        return queryset.read_preference(CATALOGUE_READ_PREFERENCE)
+
     @property
     def duration_weeks(self) -> Optional[float]:
         return self.duration / 7 if self.duration else None
@@ -170,12 +183,18 @@ class Tour(Document):
             'startLocation': self.start_location.to_json() if self.start_location else None,
             'locations': [loc.to_json() for loc in self.locations] if self.locations else [],
             'guides': [str(guide.id) for guide in self.guides] if self.guides else [],
-            'durationWeeks': self.duration_weeks
+            'durationWeeks': self.duration_weeks,
+            'imagesStatus': self.images_status
         }
 
     def populate_guides(self) -> 'Tour':
-        if self.guides:
-            self.guides = [guide for guide in self.guides]
+        """Load all guides with one User query, reading only the fields tour pages show."""
+        # Raw references: reading self.guides would dereference every guide's full document
+        references = self._data.get('guides') or []
+        if references:
+            guides = fetch_users_by_id(references, *GUIDE_FIELDS)
+            guide_ids = [getattr(reference, 'id', reference) for reference in references]
+            self.guides = [guides[guide_id] for guide_id in guide_ids if guide_id in guides]
         return self
 
 signals.pre_save.connect(Tour.pre_save, sender=Tour)
\ No newline at end of file
@@ -1,7 +1,9 @@
 from mongoengine import Document, EmailField, StringField, BooleanField, DateTimeField, EnumField
-from mongoengine import ValidationError
-from bcrypt import hashpw, gensalt, checkpw
+from mongoengine import ValidationError, queryset_manager
+from Utils.mongoPool import CATALOGUE_READ_PREFERENCE
+from Utils.passwordHashing import hash_password, check_password
 import hashlib
+from bson import ObjectId
 import secrets
 from datetime import datetime, timedelta
 from enum import Enum
@@ -24,6 +26,9 @@ class User(Document):
     name = StringField(required=True, max_length=50, help_text="Please tell us your name!")
     email = EmailField(required=True, unique=True, help_text="Please provide your email")
     photo = StringField(default="default.jpg")
+    # Progress of the background rendering of an uploaded photo; photo_job ties it to the latest upload
+    photo_status = StringField(default="ready", choices=["processing", "ready", "failed"])
+    photo_job = StringField()
     role = EnumField(Role, default=Role.USER)
     password = StringField(required=True, min_length=8, help_text="Please provide a password with at least 8 characters")
     password_confirm = StringField(required=False, help_text="Please confirm your password")
@@ -37,36 +42,43 @@ class User(Document):
     twitter = StringField(required=False, help_text="User's Twitter profile URL")
     description = StringField(max_length=500, required=False, help_text="A brief description of the user")
     profile_slug = StringField(unique=True, required=True, max_length=100, help_text="Unique HashID-based identifier for the user")
+    # Set on every save; Utils/userDirectory picks up changed users by it
+    updated_at = DateTimeField()
 
     meta = {
         'collection': 'users',
-        'indexes': ['email', 'password_reset_token', 'profile_slug']
+        'indexes': ['email', 'password_reset_token', 'profile_slug', 'updated_at']
     }
 
+    @queryset_manager
+    def catalogue(doc_cls, queryset):
+        """Public guide listing reads that may be served by a secondary (see Utils/mongoPool.CATALOGUE_READ_PREFERENCE)."""
+        return queryset.read_preference(CATALOGUE_READ_PREFERENCE)
+
     def generate_profile_slug(self):
         """
         Generate a unique profile slug as a HashID based on ObjectId.
+        The slug is derived in memory; the unique profile_slug index rejects the (theoretical) collision.
         """
         if not self.id:
             raise ValidationError("Cannot generate profile slug before ObjectId is assigned")
         unique_int = int(self.id.generation_time.timestamp() * 1000) + int(str(self.id)[18:], 16)
-        slug = hashids.encode(unique_int)
-        existing_user = User.objects(profile_slug=slug).first()
-        if existing_user and str(existing_user.id) != str(self.id):
-            raise ValidationError(f"HashID collision for slug {slug}")
-        return slug
-
-    def pre_save(self):
-        if self.password:
+        return hashids.encode(unique_int)
+
+    def password_is_dirty(self) -> bool:
+        """True when the password was set on a new user or changed since the document was loaded."""
+        return self._created or 'password' in self._get_changed_fields()
+
+    def pre_save(self, is_new: bool = False):
+        # Only a newly assigned password is plain text; hashes loaded from the database are left alone
+        if self.password and (is_new or self.password_is_dirty()):
             if isinstance(self.password, str):
-                self.password = hashpw(self.password.encode('utf-8'), gensalt(12)).decode('utf-8')
+                self.password = hash_password(self.password)
             else:
                 raise ValidationError("Password must be a string")
+            if not is_new:
+                self.password_changed_at = datetime.utcnow() - timedelta(seconds=1)
 
-        if self.id and self.password:
-            self.password_changed_at = datetime.utcnow() - timedelta(seconds=1)
-
-        # Generate profile_slug after ObjectId is assigned
         if self.id and not self.profile_slug:
             self.profile_slug = self.generate_profile_slug()
 
@@ -77,22 +89,19 @@ class User(Document):
         self.password_confirm = None
 
     def save(self, *args, **kwargs):
-        # If this is a new document (no ObjectId yet), save without validation to generate ObjectId
-        if not self.id:
-            # First save: skip validation to generate ObjectId
-            super().save(*args, validate=False, **kwargs)
-            # Generate profile_slug now that we have an ObjectId
-            self.pre_save()
-            # Second save: run validation to ensure all fields (including profile_slug) are correct
-            super().save(*args, **kwargs)
-        else:
-            # For existing documents, run validation as normal
-            self.clean()
-            self.pre_save()
-            super().save(*args, **kwargs)
+        is_new = not self.id
+        # Compare password_confirm against the plain password before it is hashed
+        self.clean()
+        if is_new:
+            # Assign the ObjectId client-side so the slug can be derived before a single insert
+            self.id = ObjectId()
+            kwargs['force_insert'] = True
+        self.pre_save(is_new=is_new)
+        self.updated_at = datetime.utcnow()
+        return super().save(*args, **kwargs)
 
     def correct_password(self, candidate_password: str, user_password: str) -> bool:
-        return checkpw(candidate_password.encode('utf-8'), user_password.encode('utf-8'))
+        return check_password(candidate_password, user_password)
 
     def changed_password_after(self, jwt_timestamp: int) -> bool:
         if self.password_changed_at:
@@ -113,6 +122,7 @@ class User(Document):
             'email': self.email,
             'role': self.role.value,
             'photo': self.photo,
+            'photo_status': self.photo_status,
             'location': getattr(self, 'location', None),
             'facebook': getattr(self, 'facebook', None),
             'instagram': getattr(self, 'instagram', None),
@@ -120,4 +130,15 @@ class User(Document):
             'description': getattr(self, 'description', None),
             'active': self.active,
             'profile_slug': self.profile_slug
-        }
\ No newline at end of file
+        }
+
+
+def fetch_users_by_id(references, *fields) -> dict:
+    """
+    Load the users behind many references (DBRefs, ObjectIds or documents) with one $in query.
+    Only `fields` are read; returns {ObjectId: User}, without the users that no longer exist.
+    """
+    user_ids = {getattr(reference, 'id', reference) for reference in references if reference is not None}
+    if not user_ids:
+        return {}
+    return {user.id: user for user in User.catalogue(id__in=list(user_ids)).only(*fields)}
@@ -2,7 +2,8 @@ from flask import Blueprint, request, g
 from controllers.tourController import (
     get_all_tours, get_tour, create_tour, update_tour, delete_tour,
     get_tour_stats, get_monthly_plan, get_tours_within, get_distances,
-    alias_top_tours, debug_tours, get_tour_by_slug  # Add new function
+    alias_top_tours, debug_tours, get_tour_by_slug,  # Add new function
+    get_tour_images_status, get_tour_reviews
 )
 from controllers.authController import protect, restrict_to
 import logging
@@ -20,6 +21,8 @@ tour_routes.route('/tour-stats', methods=['GET'], endpoint='tour_stats')(get_tou
 tour_routes.route('/', methods=['GET'], endpoint='get_all_tours')(get_all_tours)
 tour_routes.route('/<id>', methods=['GET'], endpoint='get_tour')(get_tour)
 tour_routes.route('/slug/<slug>', methods=['GET'], endpoint='get_tour_by_slug')(get_tour_by_slug)  # New route for slug-based lookup
+tour_routes.route('/<id>/reviews', methods=['GET'], endpoint='tour_reviews')(get_tour_reviews)
+tour_routes.route('/<id>/images-status', methods=['GET'], endpoint='images_status')(get_tour_images_status)
 tour_routes.route('/tours-within', methods=['GET'], endpoint='tours_within')(get_tours_within)
 tour_routes.route('/distances', methods=['GET'], endpoint='distances')(get_distances)
 
@@ -2,7 +2,7 @@ from flask import Blueprint, request, g
 from controllers.userController import (
     get_all_users, get_user, create_user, update_user, delete_user,
     set_current_user_id, update_me, delete_me, upload_user_photo, resize_user_photo, check_email,
-    get_current_user_data, serve_user_image, upload_image_to_imgs
+    get_current_user_data, serve_user_image, upload_image_to_imgs, get_my_photo_status
 )
 from controllers.authController import (
     protect, restrict_to, signup, login, logout, forgot_password, reset_password, update_password
@@ -32,6 +32,7 @@ user_routes.route('/image/<profile_slug>', methods=['GET'], endpoint='serve_user
 # Authenticated User Routes (Requires Authentication)
 user_routes.route('/update-my-password', methods=['PATCH'], endpoint='update_password')(protect(update_password))
 user_routes.route('/me', methods=['GET'], endpoint='get_me')(protect(get_current_user_data))
+user_routes.route('/me/photo-status', methods=['GET'], endpoint='photo_status')(protect(get_my_photo_status))
 user_routes.route('/update-me', methods=['PATCH'], endpoint='update_me')(protect(upload_user_photo()(resize_user_photo()(set_current_user_id(update_me)))))
 user_routes.route('/delete-me', methods=['DELETE'], endpoint='delete_me')(protect(set_current_user_id(delete_me)))
 
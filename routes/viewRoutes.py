@@ -7,25 +7,26 @@ from controllers.viewController import (
     guide_profile, payment, booking_summary, mock_payment, mock_payment_success, mock_webhook
 )
 from controllers.authController import is_logged_in, protect, logger
+from Utils.renderCache import render_cache
 
 # Define the view_routes blueprint
 view_routes = Blueprint('view_routes', __name__)
 
-# Existing routes (unchanged)
-view_routes.route('/', methods=['GET', 'POST'])(is_logged_in(alerts(home)))
-view_routes.route('/destination', methods=['GET', 'POST'])(is_logged_in(alerts(destination)))
-view_routes.route('/destination/<slug>', methods=['GET'], endpoint='get_tour_by_slug')(is_logged_in(alerts(get_tour)))
-view_routes.route('/about', methods=['GET', 'POST'])(is_logged_in(alerts(about)))
+# Existing routes; public pages are rendered once per TTL for anonymous visitors (see Utils/renderCache.py)
+view_routes.route('/', methods=['GET', 'POST'])(is_logged_in(alerts(render_cache.page('tours', 'users', 'testimonials')(home))))
+view_routes.route('/destination', methods=['GET', 'POST'])(is_logged_in(alerts(render_cache.page('tours', vary_on=('search', 'tour'))(destination))))
+view_routes.route('/destination/<slug>', methods=['GET'], endpoint='get_tour_by_slug')(is_logged_in(alerts(render_cache.page('tours', 'reviews', 'users')(get_tour))))
+view_routes.route('/about', methods=['GET', 'POST'])(is_logged_in(alerts(render_cache.page('users')(about))))
 view_routes.route('/contact', methods=['GET', 'POST'])(is_logged_in(alerts(contact)))
 view_routes.route('/service', methods=['GET', 'POST'])(is_logged_in(alerts(service)))
 view_routes.route('/404', methods=['GET', 'POST'])(is_logged_in(alerts(error)))
-view_routes.route('/team', methods=['GET', 'POST'])(is_logged_in(alerts(team)))
-view_routes.route('/testimonial', methods=['GET', 'POST'])(is_logged_in(alerts(testimonial)))
+view_routes.route('/team', methods=['GET', 'POST'])(is_logged_in(alerts(render_cache.page('users')(team))))
+view_routes.route('/testimonial', methods=['GET', 'POST'])(is_logged_in(alerts(render_cache.page('testimonials', 'users')(testimonial))))
 view_routes.route('/dashboard/<profile_slug>', methods=['GET', 'POST'])(is_logged_in(protect(dashboard)))
 view_routes.route('/image/<filename>')(serve_image)
-view_routes.route('/about/<name>', methods=['GET'], endpoint='guide_profile')(is_logged_in(alerts(guide_profile)))
-view_routes.route('/overview', endpoint='overview')(is_logged_in(alerts(home)))
-view_routes.route('/tour/<slug>')(is_logged_in(alerts(get_tour)))
+view_routes.route('/about/<name>', methods=['GET'], endpoint='guide_profile')(is_logged_in(alerts(render_cache.page('users', 'tours')(guide_profile))))
+view_routes.route('/overview', endpoint='overview')(is_logged_in(alerts(render_cache.page('tours', 'users', 'testimonials')(home))))
+view_routes.route('/tour/<slug>')(is_logged_in(alerts(render_cache.page('tours', 'reviews', 'users')(get_tour))))
 view_routes.route('/me')(is_logged_in(protect(get_my_tours)))
 view_routes.route('/mock-payment', methods=['GET'], endpoint='mock_payment')(is_logged_in(protect(mock_payment)))
 view_routes.route('/mock-webhook', methods=['POST'], endpoint='mock_webhook')(mock_webhook)
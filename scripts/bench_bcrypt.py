@@ -0,0 +1,63 @@
+"""
+Benchmark bcrypt work factors and the password hashing pool.
+
+Prints the cost of one hash per work factor, suggests the highest BCRYPT_ROUNDS that stays under a
+per-login budget, then fires a burst of concurrent logins at the pool to show queueing and 503 rejections.
+Run from the project root: python -m scripts.bench_bcrypt [target_ms] [concurrent_logins]
+"""
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from bcrypt import checkpw, gensalt, hashpw
+
+from Utils.AppError import AppError
+from Utils.passwordHashing import BCRYPT_ROUNDS, check_password, hash_password, password_hashing_stats
+
+PASSWORD = b'correct horse battery staple'
+
+
+def time_rounds(rounds, samples=3):
+    hashed = hashpw(PASSWORD, gensalt(rounds))
+    started = time.perf_counter()
+    for _ in range(samples):
+        checkpw(PASSWORD, hashed)
+    return (time.perf_counter() - started) / samples * 1000
+
+
+def main(target_ms=250.0, logins=64):
+    print(f"Single-thread checkpw cost (target {target_ms:.0f} ms per login):")
+    suggested = None
+    for rounds in range(10, 15):
+        elapsed = time_rounds(rounds)
+        marker = ' (current)' if rounds == BCRYPT_ROUNDS else ''
+        print(f"  rounds={rounds:<3} {elapsed:8.1f} ms{marker}")
+        if elapsed <= target_ms:
+            suggested = rounds
+    if suggested:
+        print(f"Suggested BCRYPT_ROUNDS={suggested}")
+
+    hashed = hash_password(PASSWORD.decode())
+
+    def login(_):
+        try:
+            check_password(PASSWORD.decode(), hashed)
+            return 'ok'
+        except AppError:
+            return 'rejected'
+
+    print(f"\nBurst of {logins} concurrent logins at BCRYPT_ROUNDS={BCRYPT_ROUNDS}:")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=logins) as request_threads:
+        # Counted here in the main thread, so the request threads never share a counter
+        outcomes = Counter(request_threads.map(login, range(logins)))
+    elapsed = time.perf_counter() - started
+    print(f"  {outcomes['ok']} verified, {outcomes['rejected']} rejected with 503 in {elapsed:.2f}s "
+          f"({outcomes['ok'] / elapsed:.1f} logins/s)")
+    print(f"  pool: {password_hashing_stats()}")
+
+
+if __name__ == '__main__':
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 250.0,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 64)
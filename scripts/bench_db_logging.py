@@ -0,0 +1,57 @@
+"""
+Per-request cost of Database logging on the image routes.
+
+Serves the same image repeatedly through /images/imgs/<filename> with the db logger at
+DEBUG (every collection access written out, as the old print() calls did), DEBUG rate-limited, and the default INFO.
+Run from the project root against a populated database: python -m scripts.bench_db_logging [filename] [requests]
+"""
+import logging
+import sys
+import time
+
+import db as db_module
+from db import db, RateLimitedDebugFilter
+from main import app
+
+
+def bench(label, client, path, requests):
+    client.get(path)  # warm the metadata and blob caches
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path)
+        response.close()
+    per_request = (time.perf_counter() - started) / requests * 1e6
+    print(f"{label:<28} {per_request:10.1f} us/request  (status {response.status_code})", file=sys.stderr)
+    return per_request
+
+
+def main(filename=None, requests=2000):
+    if filename is None:
+        image_doc = db.get_imgs_collection().find_one({}, {"filename": 1})
+        if not image_doc:
+            print("The imgs collection is empty; run the image upload script first.")
+            return
+        filename = image_doc["filename"]
+    path = f"/images/imgs/{filename}"
+    client = app.test_client()
+
+    rate_filter = next(f for f in db_module.logger.filters if isinstance(f, RateLimitedDebugFilter))
+    configurations = [
+        ("DEBUG, every access", logging.DEBUG, 0),
+        ("DEBUG, rate-limited", logging.DEBUG, db_module.DB_DEBUG_LOG_INTERVAL or 1.0),
+        ("INFO (default)", logging.INFO, db_module.DB_DEBUG_LOG_INTERVAL),
+    ]
+    results = {}
+    for label, level, interval in configurations:
+        db_module.logger.setLevel(level)
+        rate_filter.interval = interval
+        results[label] = bench(label, client, path, requests)
+
+    baseline = results["DEBUG, every access"]
+    for label, per_request in results.items():
+        print(f"{label:<28} {baseline - per_request:10.1f} us/request saved vs every access", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else None,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 2000)
@@ -0,0 +1,59 @@
+"""
+Cold-start cost of importing the app and of building it.
+
+Runs `python -X importtime -c "import main"` in fresh interpreters and reports the cumulative import time of
+`main` (median of the runs) plus the slowest modules, then times `main.create_app()` the same way. Neither step
+should touch MongoDB; run with an unreachable MONGODB_URI to check.
+Run from the project root: python -m scripts.bench_importtime [runs] [top]
+"""
+import statistics
+import subprocess
+import sys
+import time
+
+TARGETS = {
+    'import main': 'import main',
+    'create_app()': 'import main; main.create_app()',
+}
+
+
+def import_times(code):
+    """(self, cumulative) import time in microseconds per module, from one -X importtime run."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        self_us, cumulative_us, module = int(fields[0]), int(fields[1]), fields[2]
+        times[module.strip()] = (self_us, cumulative_us)
+    return times
+
+
+def wall_time(code):
+    started = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], check=True, capture_output=True)
+    return time.perf_counter() - started
+
+
+def main(runs=5, top=15):
+    samples = [import_times(TARGETS['import main']) for _ in range(runs)]
+    main_ms = statistics.median(sample['main'][1] for sample in samples) / 1000
+    print(f"import main: {main_ms:8.1f} ms cumulative (median of {runs}, -X importtime)")
+
+    last = samples[-1]
+    print("\nSlowest modules by self time (last run):")
+    for module, (self_us, cumulative_us) in sorted(last.items(), key=lambda item: -item[1][0])[:top]:
+        print(f"  {self_us / 1000:8.1f} ms self {cumulative_us / 1000:8.1f} ms cumulative  {module}")
+
+    print()
+    for label, code in TARGETS.items():
+        elapsed = statistics.median(wall_time(code) for _ in range(runs)) * 1000
+        print(f"{label:<14} {elapsed:8.1f} ms wall, interpreter start included (median of {runs})")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 15)
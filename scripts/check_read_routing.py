@@ -0,0 +1,66 @@
+"""
+Check which replica set members serve catalogue and primary-only reads (image reads included).
+
+Start a local replica set first, for example:
+    mongod --replSet rs0 --port 27017 --dbpath /tmp/rs0-0 &
+    mongod --replSet rs0 --port 27018 --dbpath /tmp/rs0-1 &
+    mongosh --eval 'rs.initiate({_id: "rs0", members: [{_id: 0, host: "localhost:27017"}, {_id: 1, host: "localhost:27018"}]})'
+then run from the project root with MONGODB_URI="mongodb://localhost:27017,localhost:27018/?replicaSet=rs0":
+    python -m scripts.check_read_routing
+"""
+from pymongo import monitoring
+
+
+class ServedBy(monitoring.CommandListener):
+    """Remember the server address that answered each command."""
+
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.commands.append((event.command_name, event.connection_id))
+
+    def failed(self, event):
+        self.commands.append((event.command_name, event.connection_id))
+
+    def take(self):
+        commands, self.commands = self.commands, []
+        return commands
+
+
+def main():
+    served_by = ServedBy()
+    monitoring.register(served_by)  # must happen before the client is created
+
+    from db import db
+    from models.tourModel import Tour
+    from Utils.mongoPool import CATALOGUE_READ_PREFERENCE
+
+    hello = db.client.admin.command('hello')
+    if not hello.get('setName'):
+        print("Not connected to a replica set; every read goes to the single server.")
+    primary = hello.get('primary')
+    print(f"Replica set {hello.get('setName')}: primary {primary}, secondaries {hello.get('hosts', [])}")
+    print(f"Catalogue read preference: {CATALOGUE_READ_PREFERENCE.document}")
+    served_by.take()
+
+    checks = {
+        'catalogue: Tour.catalogue': lambda: list(Tour.catalogue(secret_tour__ne=True).limit(5)),
+        'primary: get_image_metadata': lambda: db.get_image_metadata('check-read-routing.jpg'),
+        'primary: Tour.objects': lambda: list(Tour.objects(secret_tour__ne=True).limit(5)),
+    }
+    for label, check in checks.items():
+        db.image_meta_cache.clear()
+        check()
+        for command, address in served_by.take():
+            if command in ('find', 'aggregate'):
+                host = f"{address[0]}:{address[1]}"
+                role = 'primary' if host == primary else 'secondary'
+                print(f"{label:<30} {command:<10} served by {host} ({role})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import os
+
+from pymongo import UpdateOne
+
+from db import db
+from Utils.imageJobs import map_image_jobs, prepare_image_file
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def ingest_image_directory(image_dir, collection_name, metadata=None, renditions=False):
+    """
+    Incrementally mirror a directory of images into `imgs` or `user_imgs`.
+
+    Files whose size and mtime match the stored source are skipped without being read; files with a new
+    mtime are hashed and only re-uploaded if their content changed. Loading, compression and renditions
+    run in the image worker pool and the results are written with batched bulk upserts.
+
+    Returns:
+        dict: Counts of scanned, skipped, touched, uploaded, failed and compressed files plus total JPEG encodes, or None if the directory is missing.
+    """
+    print(f"\nIngesting images from {image_dir} into {collection_name} collection...")
+    if not image_dir or not os.path.exists(image_dir):
+        print("Image directory does not exist! Skipping upload.")
+        return None
+
+    entries = []
+    for image_file in sorted(os.listdir(image_dir)):
+        if image_file.lower().endswith(IMAGE_EXTENSIONS):
+            file_path = os.path.join(image_dir, image_file)
+            entries.append((image_file, file_path, os.stat(file_path)))
+    summary = {"scanned": len(entries), "skipped": 0, "touched": 0, "uploaded": 0, "failed": 0,
+               "compressed": 0, "encodes": 0}
+    if not entries:
+        print("No image files found in directory! Skipping upload.")
+        return summary
+
+    # Source fingerprints recorded by earlier runs, fetched in a single query
+    collection = db.get_image_collection(collection_name)
+    stored = {
+        image_doc["filename"]: image_doc.get("metadata") or {}
+        for image_doc in collection.find(
+            {"filename": {"$in": [image_file for image_file, _, _ in entries]}},
+            {"_id": 0, "filename": 1, "metadata": 1}
+        )
+    }
+
+    jobs = []
+    allow_large = db.supports_large_images()
+    for image_file, file_path, stat in entries:
+        source = stored.get(image_file, {})
+        if source.get("source_mtime") == stat.st_mtime and source.get("source_size") == stat.st_size:
+            summary["skipped"] += 1
+            continue
+        jobs.append((file_path, metadata, source.get("source_sha256"), allow_large, renditions))
+    print(f"{summary['skipped']} of {len(entries)} images unchanged since the last run, processing {len(jobs)}.")
+
+    touched = []
+
+    def prepared_images():
+        for result in map_image_jobs(prepare_image_file, jobs):
+            if result.get("error"):
+                print(f"Problem preparing {result['filename']}: {result['error']}")
+            if result.get("compression"):
+                summary["compressed"] += 1
+                summary["encodes"] += result["compression"].get("encodes", 0)
+            if result["unchanged"]:
+                # Same content under a new mtime: only the fingerprint needs refreshing
+                touched.append(result)
+                continue
+            if not result["images"]:
+                summary["failed"] += 1
+                continue
+            summary["uploaded"] += 1
+            yield from result["images"]
+
+    if jobs:
+        totals = db.save_images_bulk(collection_name, prepared_images())
+        summary["failed"] += totals["failed"]
+    if touched:
+        collection.bulk_write([
+            UpdateOne({"filename": result["filename"]}, {"$set": {
+                "metadata.source_mtime": result["source"]["source_mtime"],
+                "metadata.source_size": result["source"]["source_size"]
+            }})
+            for result in touched
+        ], ordered=False)
+        summary["touched"] = len(touched)
+
+    print(f"Finished ingesting {image_dir} into {collection_name}: {summary}")
+    return summary